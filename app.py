@@ -3,42 +3,743 @@
 Usage: flask run
 """
 
+import json
+import os
+from datetime import datetime, timezone
+from itertools import groupby
+from operator import itemgetter
+
 from flask import (
+    Blueprint,
     Flask,
+    Response,
+    abort,
+    current_app,
     flash,
+    get_flashed_messages,
     jsonify,
+    make_response,
     redirect,
     render_template,
     request,
+    stream_with_context,
     url_for,
 )
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import and_, case, func, or_
+from werkzeug.local import LocalProxy
+from werkzeug.exceptions import NotFound
+from werkzeug.routing import IntegerConverter
+
+from cache import MenuCache
+from compression import cache_compressed, compress_responses
+from config import CONFIGS
+from database import create_engine, create_read_engine, session
+from fingerprint import fingerprint_build, fingerprint_static_files
+from json_provider import FastJSONProvider
+from menu_batch import MenuBatch, is_course, menu_item_values
+from metrics import Metrics
+from migrations import init_db_command
+from models import (
+    MenuItem,
+    SQLITE_INT_RANGE,
+    MenuSnapshot,
+    Restaurant,
+    format_price,
+    parse_int,
+    parse_price,
+)
+from query_budget import check_query_budgets, query_budget
+from replica import sync_replica_command
+from search import search
+from snapshots import (
+    check_snapshots_command,
+    rebuild_snapshots_command,
+    refresh_snapshot,
+)
+
+bp = Blueprint("main", __name__)
+menu_cache = LocalProxy(lambda: current_app.extensions["menu_cache"])
+
+
+def create_app(config=None):
+    """Creates the app with its db engines, menu cache and metrics.
+
+    Args:
+        config: The class or object holding the app's configuration, by
+            default the one named by the APP_CONFIG environment variable
+
+    Returns:
+        app: A flask app serving the restaurants and their menus
+    """
+    if config is None:
+        config = CONFIGS[os.environ.get("APP_CONFIG", "default")]
+
+    app = Flask(__name__)
+    app.config.from_object(config)
+    app.secret_key = app.config["SECRET_KEY"]
+    app.json = FastJSONProvider(app)
+
+    app.extensions["engine"] = create_engine(app.config)
+    app.extensions["read_engine"] = create_read_engine(app.config)
+    app.extensions["metrics"] = Metrics()
+    app.extensions["metrics"].init_app(app)
+    app.extensions["metrics"].instrument_engine(app.extensions["engine"])
+    if app.extensions["read_engine"] is None:
+        app.extensions["read_engine"] = app.extensions["engine"]
+    else:
+        app.extensions["metrics"].instrument_engine(
+            app.extensions["read_engine"]
+        )
+    check_query_budgets(app)
+    compress_responses(app)
+    fingerprint_static_files(app)
+    fingerprint_build(app)
+    app.extensions["menu_cache"] = MenuCache(
+        app.config["MENU_CACHE_SIZE"],
+        app.config["MENU_CACHE_TTL"],
+        app.config["MENU_CACHE_MAX_KEYS"],
+    )
+
+    app.url_map.converters["int"] = SqliteIntegerConverter
+    app.register_blueprint(bp)
+    app.teardown_appcontext(remove_session)
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(sync_replica_command)
+    app.cli.add_command(rebuild_snapshots_command)
+    app.cli.add_command(check_snapshots_command)
+
+    return app
+
+
+def remove_session(exception=None):  # pylint: disable=unused-argument
+    """Closes the session for the current thread at the end of a request.
+
+    Any uncommitted transaction (e.g. after a failed commit) is rolled back
+    so it can't leak into the next request served by the same thread.
 
-from models import Base, MenuItem, Restaurant
+    Args:
+        exception: The exception that ended the request, if any (unused)
+    """
+    session.remove()
+
+
+@bp.app_errorhandler(400)
+@bp.app_errorhandler(404)
+def api_error(error):
+    """Reports invalid requests and missing resources in the api as json.
+
+    Args:
+        error: The HTTPException raised for the request
+
+    Returns:
+        A json object describing the error for api requests, or the default
+            error page otherwise
+    """
+    if request.path.startswith("/api/"):
+        return jsonify(error=error.description), error.code
+
+    return error
+
+
+def course_order():
+    """Builds a sql expression ordering menu items by their course.
+
+    Uncategorized menu items come first, followed by each configured course
+    in the order given by MENU_COURSES.
+
+    Returns:
+        A sqlalchemy Case usable in an order_by clause
+    """
+    courses = current_app.config["MENU_COURSES"]
+    return case(
+        {course: rank for rank, course in enumerate(courses, start=1)},
+        value=MenuItem.course,
+        else_=0,
+    )
+
+
+def group_by_course(menu_items):
+    """Groups menu items already ordered by course_order in a single pass.
+
+    Args:
+        menu_items: An iterable of MenuItem objects ordered by course_order
+
+    Returns:
+        courses: A list of dicts, one per course with menu items, each with
+            the heading to display (None for uncategorized items) and the
+            menu items in that course
+    """
+    headings = current_app.config["MENU_COURSES"]
+    courses = []
+    for menu_item in menu_items:
+        heading = headings.get(menu_item.course)
+        if not courses or courses[-1]["heading"] != heading:
+            courses.append({"heading": heading, "menu_items": []})
+        courses[-1]["menu_items"].append(menu_item)
+
+    return courses
+
+
+class SqliteIntegerConverter(IntegerConverter):
+    """Matches the ints of urls, only within the range sqlite stores.
+
+    Larger ids can't be in the db, so they are answered with a 404 instead
+    of overflowing in the query.
+    """
+
+    def to_python(self, value):
+        """Converts the matched part of the url to an int.
+
+        Args:
+            value: A str representing the int
+
+        Returns:
+            An int within the range sqlite stores integers in
+
+        Raises:
+            NotFound: If the int is out of sqlite's range (a ValidationError
+                would let werkzeug answer a 405 when the url has rules for
+                other methods)
+        """
+        number = super().to_python(value)
+        if number not in SQLITE_INT_RANGE:
+            raise NotFound()
+
+        return number
+
+
+def page_params(keys):
+    """Reads the page size and cursor for keyset pagination from the request.
+
+    Args:
+        keys: The columns the rows are ordered by, ending with the primary key
+            of the queried model
+
+    Returns:
+        limit: An int representing the number of rows on the page, or None if
+            neither a limit nor an after param was given
+        values: A list of the values of the keys on the last row of the
+            previous page, or None for the first page
+    """
+    limit = request.args.get("limit", type=int)
+    after = request.args.get("after")
+    if limit is None and after is None:
+        return None, None
+
+    if limit is None:
+        limit = current_app.config["API_PAGE_SIZE"]
+    limit = min(max(limit, 1), current_app.config["API_MAX_PAGE_SIZE"])
+
+    values = None
+    if after is not None:
+        try:
+            values = [parse_int(value) for value in after.split(".")]
+        except ValueError:
+            values = []
+        if len(values) != len(keys):
+            abort(400, "Invalid after cursor")
+
+    return limit, values
+
+
+def after_condition(keys, values):
+    """Builds the condition selecting the rows that come after a cursor.
+
+    Args:
+        keys: The columns the rows are ordered by
+        values: A list of the values of the keys to start after
+
+    Returns:
+        A sqlalchemy expression usable in a filter or where clause
+    """
+    conditions = []
+    for index, key in enumerate(keys):
+        equal = [
+            previous_key == value
+            for previous_key, value in zip(keys[:index], values)
+        ]
+        conditions.append(and_(*equal, key > values[index]))
+
+    return or_(*conditions)
+
+
+def next_page(rows, keys, limit):
+    """Trims the extra row fetched to tell whether there is another page.
+
+    Args:
+        rows: A list of up to limit + 1 rows
+        keys: The columns the rows are ordered by
+        limit: An int representing the number of rows on the page
+
+    Returns:
+        rows: A list of the rows on the page
+        next_cursor: A str to pass as the after param to retrieve the next
+            page, or None if this is the last page
+    """
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = ".".join(str(getattr(rows[-1], key.key)) for key in keys)
+
+    return rows, next_cursor
+
+
+def paginate(query, *keys):
+    """Applies keyset pagination to a query from the request's query params.
+
+    Pages are selected with a `keys > after` condition on the columns the
+    rows are ordered by rather than an OFFSET, so every page costs the same
+    no matter how deep into the table it is. Without a limit or after param
+    the query is returned in full, as before pagination was supported.
+
+    Args:
+        query: A sqlalchemy Query to paginate
+        keys: The columns to order the rows by, ending with the primary key
+            of the queried model
+
+    Returns:
+        rows: A list of the rows on the requested page
+        next_cursor: A str to pass as the after param to retrieve the next
+            page, or None if this is the last page
+    """
+    limit, values = page_params(keys)
+    query = query.order_by(*keys)
+
+    if limit is None:
+        return query.all(), None
+
+    if values is not None:
+        query = query.filter(after_condition(keys, values))
+
+    return next_page(query.limit(limit + 1).all(), keys, limit)
+
+
+def price_param(name):
+    """Reads a price from the request's query params.
+
+    Args:
+        name: A str representing the name of the query param
 
-engine = create_engine("sqlite:///restaurant_menu.db")
-Base.metadata.bind = engine
-DBSession = sessionmaker(bind=engine)
-session = DBSession()
+    Returns:
+        An int representing the price in cents, or None if not given
+    """
+    try:
+        return parse_price(request.args.get(name))
+    except ValueError:
+        abort(400, f"Invalid {name}")
+
+
+def restaurant_values(data):
+    """Validates the fields of a restaurant sent to the api as json.
+
+    Args:
+        data: A dict representing the fields of the restaurant to change
+
+    Returns:
+        values: A dict mapping the names of Restaurant's columns to the
+            values to store
+
+    Raises:
+        ValueError: If the restaurant has unknown or invalid fields
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Restaurant must be an object")
+
+    unknown = set(data) - {"name"}
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+
+    name = data.get("name")
+    if not isinstance(name, str) or not name.strip():
+        raise ValueError("Missing name")
+
+    values = {"name": name}
+    return values
+
+
+def include_stats():
+    """Reads whether menu stats were requested with an include=stats param.
+
+    Returns:
+        A bool indicating whether to include each restaurant's menu stats
+    """
+    include = request.args.get("include")
+    if include not in (None, "stats"):
+        abort(400, "Invalid include")
+
+    return include == "stats"
+
+
+def menu_stats_columns():
+    """Builds the aggregates of a restaurant's menu, grouped by restaurant.
+
+    Returns:
+        A tuple of sqlalchemy expressions of the number of menu items, the
+            number in each of MENU_COURSES and the lowest and highest price in
+            cents, for a select of restaurants outer joined to menu_items
+    """
+    courses = current_app.config["MENU_COURSES"]
+    return (
+        func.count(MenuItem.id),
+        *(
+            func.sum(case({course: 1}, value=MenuItem.course, else_=0))
+            for course in courses
+        ),
+        func.min(MenuItem.price_cents),
+        func.max(MenuItem.price_cents),
+    )
+
+
+def serialize_with_stats(row):
+    """Serializes a restaurant with the stats of its menu.
+
+    Args:
+        row: A sequence of the values of Restaurant.serialize_columns
+            followed by those of menu_stats_columns
+
+    Returns:
+        restaurant: A dict representing the restaurant, with a stats dict of
+            its number of menu_items, the number in each of the courses and
+            its min_price and max_price (None without prices)
+    """
+    columns = len(Restaurant.serialize_columns())
+    restaurant = Restaurant.serialize_row(row[:columns])
+    menu_item_count, *course_counts, min_price, max_price = row[columns:]
+    restaurant["stats"] = {
+        "menu_items": menu_item_count,
+        "courses": dict(
+            zip(current_app.config["MENU_COURSES"], course_counts)
+        ),
+        "min_price": format_price(min_price),
+        "max_price": format_price(max_price),
+    }
+    return restaurant
+
+
+def is_full_menu(key):
+    """Checks whether a menu items api request is for a restaurant's snapshot.
+
+    Only the full menu, unfiltered and in order of id, is snapshotted.
+
+    Args:
+        key: A tuple of the endpoint and the limit, after, min_price,
+            max_price and sort params of the request, as cached under
+
+    Returns:
+        A bool indicating whether the request can be served by the snapshot
+    """
+    return all(value is None for value in key[1:5]) and key[5] == "id"
+
+
+def touch_restaurant(restaurant_id):
+    """Marks a restaurant's menu as changed so clients refetch it.
+
+    Must be called before committing the change it records, which also
+    refreshes the restaurant's menu snapshot in the same transaction.
+
+    Args:
+        restaurant_id: An int representing the id of the restaurant
+    """
+    session.query(Restaurant).filter_by(id=restaurant_id).update(
+        {
+            Restaurant.version: Restaurant.version + 1,
+            Restaurant.updated_at: datetime.utcnow(),
+        },
+        synchronize_session=False,
+    )
+    refresh_snapshot(session, restaurant_id)
+
+
+def catalog_version():
+    """Retrieves the version of the list of restaurants.
+
+    Any restaurant being created, changed or deleted changes the count or
+    the latest update time, so the pair identifies the state of the list.
+
+    Returns:
+        tag: A str identifying the current state of the restaurants
+        updated_at: A datetime (utc) of the latest change, or None
+    """
+    count, updated_at = session.query(
+        func.count(Restaurant.id), func.max(Restaurant.updated_at)
+    ).one()
+    tag = f"{count}.{updated_at:%Y%m%d%H%M%S%f}" if updated_at else "0"
+
+    return tag, updated_at
+
+
+def menu_version_tag(restaurant_id, version, updated_at):
+    """Builds the tag identifying a state of a restaurant's menu.
+
+    sqlite reuses the id of the last restaurant when it is deleted, and the
+    new restaurant starts again at version 1, so the time of the latest
+    change is part of the tag too and a new restaurant never gets the tag of
+    a deleted one.
+
+    Args:
+        restaurant_id: An int representing the id of the restaurant
+        version: An int representing the restaurant's version
+        updated_at: A datetime (utc) of the restaurant's latest change, or
+            None
+
+    Returns:
+        A str identifying the state of the menu
+    """
+    changed = f"{updated_at:%Y%m%d%H%M%S%f}" if updated_at else "0"
+    return f"{restaurant_id}.{version}.{changed}"
+
+
+def restaurant_version(restaurant_id):
+    """Retrieves the version of a restaurant's menu without loading it.
+
+    Args:
+        restaurant_id: An int representing the id of the restaurant
+
+    Returns:
+        A tuple of a str identifying the current state of the menu and the
+            datetime (utc) of its latest change, or None if the restaurant
+            doesn't exist
+    """
+    row = (
+        session.query(Restaurant.version, Restaurant.updated_at)
+        .filter_by(id=restaurant_id)
+        .first()
+    )
+    if row is None:
+        return None
+
+    return (
+        menu_version_tag(restaurant_id, row.version, row.updated_at),
+        row.updated_at,
+    )
+
+
+def menu_snapshot(restaurant_id):
+    """Retrieves the version of a restaurant's menu and its snapshot.
+
+    Both come from a single primary key lookup. A snapshot of an older
+    version than the restaurant's (e.g. after a change made directly to the
+    db) isn't returned, so the menu is served from menu_items instead.
+
+    Args:
+        restaurant_id: An int representing the id of the restaurant
+
+    Returns:
+        version: The version of the menu, as restaurant_version returns it
+        menu: A str of the json of the full menu, or None if the restaurant
+            has no up to date snapshot
+    """
+    row = (
+        session.query(
+            Restaurant.version,
+            Restaurant.updated_at,
+            MenuSnapshot.version.label("snapshot_version"),
+            MenuSnapshot.menu,
+        )
+        .outerjoin(MenuSnapshot, MenuSnapshot.restaurant_id == Restaurant.id)
+        .filter(Restaurant.id == restaurant_id)
+        .first()
+    )
+    if row is None:
+        return None, None
+
+    version = (
+        menu_version_tag(restaurant_id, row.version, row.updated_at),
+        row.updated_at,
+    )
+    if row.snapshot_version != row.version:
+        return version, None
+
+    return version, row.menu
+
+
+def menu_item_version(menu_item_id):
+    """Retrieves the version of a menu item without loading it.
+
+    Args:
+        menu_item_id: An int representing the id of the menu item
+
+    Returns:
+        A tuple of a str identifying the current state of the menu item and
+            the datetime (utc) of its latest change, or None if the menu item
+            doesn't exist
+    """
+    row = session.query(MenuItem.updated_at).filter_by(id=menu_item_id).first()
+    if row is None or row.updated_at is None:
+        return None
 
-app = Flask(__name__)
-app.secret_key = "super_secret_key"
+    return f"{menu_item_id}.{row.updated_at:%Y%m%d%H%M%S%f}", row.updated_at
 
 
-@app.route("/")
-@app.route("/restaurants/")
+def version_tag(version):
+    """Extracts the tag of a data version, to cache a response's body under.
+
+    The body is only served from the cache for the version the ETag is
+    derived from, so a body cached before a change made by another process
+    is never sent under the changed data's ETag.
+
+    Args:
+        version: A tuple of a str tag and a datetime (utc) as returned by the
+            *_version functions, or None
+
+    Returns:
+        A str of the tag, or None if there is no version
+    """
+    return None if version is None else version[0]
+
+
+def page_version(version):
+    """Adds the app's build to the version of the data an html page shows.
+
+    A page also changes when its templates or the static files it links to
+    are deployed, so its ETag and Last-Modified must change with them.
+
+    Args:
+        version: A tuple of a str tag and a datetime (utc) as returned by the
+            *_version functions, or None
+
+    Returns:
+        A tuple of the tag with the build fingerprint added and the later of
+            the data's and the build's latest change, or None if there is no
+            version
+    """
+    if version is None:
+        return None
+
+    tag, updated_at = version
+    build, built_at = current_app.extensions["build"]
+    if updated_at is None or built_at > updated_at:
+        updated_at = built_at
+
+    return f"{tag}.{build}", updated_at
+
+
+def validators(version):
+    """Derives the ETag and Last-Modified of a response from a data version.
+
+    The ETag is derived from the endpoint and the version of the data it
+    shows, so checking it never requires loading or serializing the data.
+
+    Args:
+        version: A tuple of a str tag and a datetime (utc) as returned by the
+            *_version functions
+
+    Returns:
+        etag: A str representing the ETag of the response
+        last_modified: A datetime (utc, whole seconds) of the latest change,
+            or None
+    """
+    tag, updated_at = version
+    etag = f"{request.endpoint}-{tag}"
+    last_modified = None
+    if updated_at is not None:
+        last_modified = updated_at.replace(microsecond=0, tzinfo=timezone.utc)
+
+    return etag, last_modified
+
+
+def client_is_current(etag, last_modified):
+    """Checks the request's conditional headers against a response's.
+
+    Args:
+        etag: A str representing the ETag of the response
+        last_modified: A datetime (utc) of the latest change, or None
+
+    Returns:
+        A bool indicating whether the client's copy is still current
+    """
+    if request.if_none_match:
+        # Compressed responses are sent with the weak form of the ETag
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and last_modified:
+        return last_modified <= request.if_modified_since
+
+    return False
+
+
+def set_validators(response, etag, last_modified):
+    """Sets a response's ETag and Last-Modified, requiring revalidation.
+
+    Args:
+        response: The flask Response to set the headers on
+        etag: A str representing the ETag of the response
+        last_modified: A datetime (utc) of the latest change, or None
+
+    Returns:
+        response: The same response
+    """
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.no_cache = True
+
+    return response
+
+
+def conditional_response(version, respond):
+    """Answers a GET with a 304 if the client's copy is still current.
+
+    Args:
+        version: A tuple of a str tag and a datetime (utc) as returned by the
+            *_version functions, or None to skip the check
+        respond: A function taking no arguments that builds the full response
+
+    Returns:
+        response: A 304 response or the full response, with ETag and
+            Last-Modified headers set
+    """
+    if version is None:
+        return respond()
+
+    etag, last_modified = validators(version)
+    if client_is_current(etag, last_modified):
+        response = current_app.response_class(status=304)
+    else:
+        response = make_response(respond())
+
+    return set_validators(response, etag, last_modified)
+
+
+@bp.route("/")
+@bp.route("/restaurants/")
+@query_budget(2)
 def show_restaurants():
     """Route handler for viewing all restaurants.
 
+    Accepts an optional include=stats query param to show the number of menu
+    items, courses and the price range of every restaurant, aggregated in the
+    same query as the restaurants.
+
     Returns:
         An html template showing all restaurants
     """
-    restaurants = session.query(Restaurant).all()
-    return render_template("restaurants.html", restaurants=restaurants)
+    stats = include_stats()
+
+    def render_restaurants():
+        if stats:
+            rows = (
+                session.query(
+                    *Restaurant.serialize_columns(), *menu_stats_columns()
+                )
+                .outerjoin(MenuItem, MenuItem.restaurant_id == Restaurant.id)
+                .group_by(Restaurant.id)
+                .order_by(Restaurant.id)
+            )
+            restaurants = [serialize_with_stats(row) for row in rows]
+        else:
+            restaurants = session.query(Restaurant).all()
+        return render_template("restaurants.html", restaurants=restaurants)
+
+    # Pages showing flashed messages are specific to one visitor
+    if get_flashed_messages():
+        return render_restaurants()
+
+    return conditional_response(
+        page_version(catalog_version()), render_restaurants
+    )
 
 
-@app.route("/restaurants/new/", methods=["GET", "POST"])
+@bp.route("/restaurants/new/", methods=["GET", "POST"])
+@query_budget(3)
 def new_restaurant():
     """Route handler for creating a new restaurant.
 
@@ -50,13 +751,16 @@ def new_restaurant():
 
     restaurant = Restaurant(name=request.form.get("name"))
     session.add(restaurant)
+    session.flush()
+    refresh_snapshot(session, restaurant.id)
     session.commit()
     flash("New Restaurant Created!")
 
-    return redirect(url_for("show_restaurants"))
+    return redirect(url_for("main.show_restaurants"))
 
 
-@app.route("/restaurants/<int:restaurant_id>/edit/", methods=["GET", "POST"])
+@bp.route("/restaurants/<int:restaurant_id>/edit/", methods=["GET", "POST"])
+@query_budget(5)
 def edit_restaurant(restaurant_id):
     """Route handler for modifying an existing restaurant.
 
@@ -76,13 +780,16 @@ def edit_restaurant(restaurant_id):
             setattr(restaurant, field, request.form.get(field))
 
     session.add(restaurant)
+    touch_restaurant(restaurant_id)
     session.commit()
+    menu_cache.invalidate(restaurant_id)
     flash("Restaurant Updated!")
 
-    return redirect(url_for("show_restaurants"))
+    return redirect(url_for("main.show_restaurants"))
 
 
-@app.route("/restaurants/<int:restaurant_id>/delete/", methods=["GET", "POST"])
+@bp.route("/restaurants/<int:restaurant_id>/delete/", methods=["GET", "POST"])
+@query_budget(4)
 def delete_restaurant(restaurant_id):
     """Route handler to delete and existing restaurant.
 
@@ -98,14 +805,17 @@ def delete_restaurant(restaurant_id):
         return render_template("delete_restaurant.html", restaurant=restaurant)
 
     session.delete(restaurant)
+    refresh_snapshot(session, restaurant_id)
     session.commit()
+    menu_cache.invalidate(restaurant_id)
     flash("Restaurant Deleted!")
 
-    return redirect(url_for("show_restaurants"))
+    return redirect(url_for("main.show_restaurants"))
 
 
-@app.route("/restaurants/<int:restaurant_id>/")
-@app.route("/restaurants/<int:restaurant_id>/menu/")
+@bp.route("/restaurants/<int:restaurant_id>/")
+@bp.route("/restaurants/<int:restaurant_id>/menu/")
+@query_budget(3)
 def show_menu_items(restaurant_id):
     """Route handler for displaying the menu for a given restaurant.
 
@@ -116,47 +826,44 @@ def show_menu_items(restaurant_id):
     Returns:
         An html template with the given restaurant's menu displayed
     """
-    restaurant = session.query(Restaurant).filter_by(id=restaurant_id).one()
-    menu_items = (
-        session.query(MenuItem).filter_by(restaurant_id=restaurant_id).all()
-    )
 
-    appetizers = [
-        menu_item
-        for menu_item in menu_items
-        if menu_item.course == "Appetizer"
-    ]
-    entrees = [
-        menu_item for menu_item in menu_items if menu_item.course == "Entree"
-    ]
-    desserts = [
-        menu_item for menu_item in menu_items if menu_item.course == "Dessert"
-    ]
-    beverages = [
-        menu_item for menu_item in menu_items if menu_item.course == "Beverage"
-    ]
-    uncategorized = [
-        menu_item
-        for menu_item in menu_items
-        if menu_item.course
-        not in ("Appetizer", "Entree", "Dessert", "Beverage")
-    ]
-
-    return render_template(
-        "menu_items.html",
-        restaurant=restaurant,
-        menu_items=len(menu_items) > 0,
-        appetizers=appetizers,
-        entrees=entrees,
-        desserts=desserts,
-        beverages=beverages,
-        uncategorized=uncategorized,
+    def render_menu():
+        restaurant = (
+            session.query(Restaurant).filter_by(id=restaurant_id).one()
+        )
+        menu_items = (
+            session.query(MenuItem)
+            .filter_by(restaurant_id=restaurant_id)
+            .order_by(course_order(), MenuItem.id)
+        )
+
+        return render_template(
+            "menu_items.html",
+            restaurant=restaurant,
+            courses=group_by_course(menu_items),
+        )
+
+    # Pages showing flashed messages are specific to one visitor
+    if get_flashed_messages():
+        return render_menu()
+
+    version = page_version(restaurant_version(restaurant_id))
+    tag = version_tag(version)
+    cache_compressed(
+        restaurant_id, "show_menu_items", menu_cache.generation, tag
+    )
+    return conditional_response(
+        version,
+        lambda: menu_cache.get_or_set(
+            restaurant_id, "show_menu_items", render_menu, tag
+        ),
     )
 
 
-@app.route(
+@bp.route(
     "/restaurants/<int:restaurant_id>/menu/new/", methods=["GET", "POST"]
 )
+@query_budget(4)
 def new_menu_item(restaurant_id):
     """Route handler for creating a new menu item for the given restaurant.
 
@@ -169,27 +876,49 @@ def new_menu_item(restaurant_id):
     """
     if request.method == "GET":
         return render_template(
-            "new_menu_item.html", restaurant_id=restaurant_id
+            "new_menu_item.html",
+            restaurant_id=restaurant_id,
+            courses=current_app.config["MENU_COURSES"],
+        )
+
+    course = request.form.get("course") or None
+    if not is_course(course):
+        flash("Invalid Course! Menu Item Not Created")
+        return redirect(
+            url_for("main.show_menu_items", restaurant_id=restaurant_id)
+        )
+
+    try:
+        menu_item = MenuItem(
+            name=request.form.get("name"),
+            course=course,
+            description=request.form.get("description"),
+            price=request.form.get("price"),
+            restaurant_id=restaurant_id,
+        )
+    except ValueError:
+        flash("Invalid Price! Menu Item Not Created")
+        return redirect(
+            url_for("main.show_menu_items", restaurant_id=restaurant_id)
         )
 
-    menu_item = MenuItem(
-        name=request.form.get("name"),
-        course=request.form.get("course"),
-        description=request.form.get("description"),
-        price=request.form.get("price"),
-        restaurant_id=restaurant_id,
-    )
     session.add(menu_item)
+    touch_restaurant(restaurant_id)
     session.commit()
+    menu_cache.invalidate(restaurant_id)
     flash("New Menu Item Created!")
 
-    return redirect(url_for("show_menu_items", restaurant_id=restaurant_id))
+    return redirect(
+        url_for("main.show_menu_items", restaurant_id=restaurant_id)
+    )
 
 
-@app.route(
+@bp.route(
     "/restaurants/<int:restaurant_id>/menu/<int:menu_item_id>/edit/",
     methods=["GET", "POST"],
 )
+# Moving a menu item to another restaurant touches both restaurants
+@query_budget(8)
 def edit_menu_item(restaurant_id, menu_item_id):
     """Route handler for modifying an existing menu item.
 
@@ -204,23 +933,49 @@ def edit_menu_item(restaurant_id, menu_item_id):
     menu_item = session.query(MenuItem).filter_by(id=menu_item_id).one()
 
     if request.method == "GET":
-        return render_template("edit_menu_item.html", menu_item=menu_item)
+        return render_template(
+            "edit_menu_item.html",
+            menu_item=menu_item,
+            courses=current_app.config["MENU_COURSES"],
+        )
 
-    for field in request.form:
-        if len(request.form.get(field)) > 0:
-            setattr(menu_item, field, request.form.get(field))
+    if not is_course(request.form.get("course") or None):
+        flash("Invalid Course! Menu Item Not Updated")
+        return redirect(
+            url_for("main.show_menu_items", restaurant_id=restaurant_id)
+        )
+
+    previous_restaurant_id = menu_item.restaurant_id
+    try:
+        for field in request.form:
+            if len(request.form.get(field)) > 0:
+                setattr(menu_item, field, request.form.get(field))
+    except ValueError:
+        session.rollback()
+        flash("Invalid Price! Menu Item Not Updated")
+        return redirect(
+            url_for("main.show_menu_items", restaurant_id=restaurant_id)
+        )
 
     session.add(menu_item)
+    restaurant_ids = {previous_restaurant_id, menu_item.restaurant_id}
+    for changed_restaurant_id in restaurant_ids:
+        touch_restaurant(changed_restaurant_id)
     session.commit()
+    for changed_restaurant_id in restaurant_ids:
+        menu_cache.invalidate(changed_restaurant_id)
     flash("Menu Item Updated!")
 
-    return redirect(url_for("show_menu_items", restaurant_id=restaurant_id))
+    return redirect(
+        url_for("main.show_menu_items", restaurant_id=restaurant_id)
+    )
 
 
-@app.route(
+@bp.route(
     "/restaurants/<int:restaurant_id>/menu/<int:menu_item_id>/delete/",
     methods=["GET", "POST"],
 )
+@query_budget(5)
 def delete_menu_item(restaurant_id, menu_item_id):
     """Route handler for deleting an existing menu item.
 
@@ -238,68 +993,472 @@ def delete_menu_item(restaurant_id, menu_item_id):
         return render_template("delete_menu_item.html", menu_item=menu_item)
 
     session.delete(menu_item)
+    touch_restaurant(menu_item.restaurant_id)
     session.commit()
+    menu_cache.invalidate(menu_item.restaurant_id)
     flash("Menu Item Deleted!")
 
-    return redirect(url_for("show_menu_items", restaurant_id=restaurant_id))
+    return redirect(
+        url_for("main.show_menu_items", restaurant_id=restaurant_id)
+    )
 
 
-@app.route("/api/restaurants/")
+@bp.route("/api/restaurants/")
+@query_budget(2)
 def restaurants_api():
     """Route handler for api endpoint retreiving all restaurants.
 
+    Accepts optional limit and after query params to page through the
+    restaurants in order of id, and an include=stats query param to add the
+    stats of each restaurant's menu, aggregated in the same query.
+
     Returns:
-        response: A json object containing all restaurants
+        response: A json object containing all restaurants (or a page of
+            them) and the cursor for the next page
     """
-    restaurants = session.query(Restaurant).all()
-    response = jsonify(
-        restaurants=[restaurant.serialize for restaurant in restaurants]
-    )
+    stats = include_stats()
+
+    def serialize_restaurants():
+        if stats:
+            rows, next_cursor = paginate(
+                session.query(
+                    *Restaurant.serialize_columns(), *menu_stats_columns()
+                )
+                .outerjoin(MenuItem, MenuItem.restaurant_id == Restaurant.id)
+                .group_by(Restaurant.id),
+                Restaurant.id,
+            )
+            restaurants = [serialize_with_stats(row) for row in rows]
+        else:
+            rows, next_cursor = paginate(
+                session.query(*Restaurant.serialize_columns()), Restaurant.id
+            )
+            restaurants = [Restaurant.serialize_row(row) for row in rows]
+
+        return jsonify(restaurants=restaurants, next=next_cursor)
+
+    response = conditional_response(catalog_version(), serialize_restaurants)
 
     return response
 
 
-@app.route("/api/restaurants/<int:restaurant_id>/")
-@app.route("/api/restaurants/<int:restaurant_id>/menu/")
+@bp.route("/api/restaurants/<int:restaurant_id>/")
+@bp.route("/api/restaurants/<int:restaurant_id>/menu/")
+@query_budget(2)
 def menu_items_api(restaurant_id):
     """Route handler for api endpoint retreiving menu items for a restaurant.
 
+    Accepts optional limit and after query params to page through the menu
+    items in order of id, min_price and max_price query params (e.g. 9.99)
+    to filter them by price and a sort=price query param to order them by
+    price instead. Filtering and sorting by price skip items without one.
+
     Args:
         restaurant_id: An int representing the id of the restaurant whose menu
             items are to be retrieved
 
     Returns:
-        response: A json object containing all menu items for a given
-            restaurant
+        response: A json object containing all menu items (or a page of them)
+            for a given restaurant and the cursor for the next page
+    """
+    min_price = price_param("min_price")
+    max_price = price_param("max_price")
+    sort = request.args.get("sort", "id")
+    if sort not in ("id", "price"):
+        abort(400, "Invalid sort")
+
+    def serialize_menu():
+        query = session.query(*MenuItem.serialize_columns()).filter(
+            MenuItem.restaurant_id == restaurant_id
+        )
+        if min_price is not None:
+            query = query.filter(MenuItem.price_cents >= min_price)
+        if max_price is not None:
+            query = query.filter(MenuItem.price_cents <= max_price)
+
+        if sort == "price":
+            rows, next_cursor = paginate(
+                query.filter(MenuItem.price_cents.isnot(None)),
+                MenuItem.price_cents,
+                MenuItem.id,
+            )
+        else:
+            rows, next_cursor = paginate(query, MenuItem.id)
+
+        return jsonify(
+            menu_items=[MenuItem.serialize_row(row) for row in rows],
+            next=next_cursor,
+        ).get_data()
+
+    key = (
+        "menu_items_api",
+        request.args.get("limit", type=int),
+        request.args.get("after"),
+        min_price,
+        max_price,
+        sort,
+    )
+    menu = None
+    if is_full_menu(key):
+        version, menu = menu_snapshot(restaurant_id)
+    else:
+        version = restaurant_version(restaurant_id)
+    tag = version_tag(version)
+    cache_compressed(restaurant_id, key, menu_cache.generation, tag)
+
+    def respond():
+        body = menu
+        if body is None:
+            body = menu_cache.get_or_set(
+                restaurant_id, key, serialize_menu, tag
+            )
+        return current_app.response_class(body, mimetype="application/json")
+
+    response = conditional_response(version, respond)
+
+    return response
+
+
+@bp.route("/api/restaurants/<int:restaurant_id>/menu/batch/", methods=["POST"])
+# One statement for each kind of change and one reading back the created ids,
+# besides the lookups and touching the restaurant
+@query_budget(9)
+def menu_items_batch_api(restaurant_id):
+    """Route handler for api endpoint changing many menu items at once.
+
+    Accepts a json object with optional create, update and delete lists:
+    menu items to create (with a name and optionally a course, description
+    and price), menu items to update (with their id and the fields to
+    change) and the ids of menu items to delete. Every change is applied
+    with bulk statements in a single transaction, or none are if any of them
+    is invalid.
+
+    Args:
+        restaurant_id: An int representing the id of the restaurant whose menu
+            is to be changed
+
+    Returns:
+        response: A json object with a list of results for each of create,
+            update and delete, in the order sent, giving the status (and id)
+            of every menu item
     """
-    menu_items = (
-        session.query(MenuItem).filter_by(restaurant_id=restaurant_id).all()
+    if (
+        session.query(Restaurant.id).filter_by(id=restaurant_id).first()
+        is None
+    ):
+        abort(404, "Restaurant not found")
+
+    try:
+        batch = MenuBatch(restaurant_id, request.get_json(silent=True))
+    except ValueError as error:
+        abort(400, str(error))
+
+    if not batch.validate(session):
+        return jsonify(batch.results), 400
+
+    batch.apply(session)
+    touch_restaurant(restaurant_id)
+    session.commit()
+    menu_cache.invalidate(restaurant_id)
+
+    response = jsonify(batch.results)
+
+    return response
+
+
+@bp.route("/api/menus/")
+@query_budget(1)
+def menus_api():
+    """Route handler for api endpoint retreiving the menus of many restaurants.
+
+    Accepts an ids query param with a comma separated list of restaurant ids
+    (at most API_MAX_BATCH_SIZE) and loads all of their menu items with a
+    single query.
+
+    Returns:
+        response: A json object containing a menu for each requested
+            restaurant, in the order requested, with the restaurant's id and
+            its menu items (empty for unknown restaurants)
+    """
+    try:
+        restaurant_ids = list(
+            dict.fromkeys(
+                parse_int(restaurant_id)
+                for restaurant_id in request.args.get("ids", "").split(",")
+                if restaurant_id.strip()
+            )
+        )
+    except ValueError:
+        abort(400, "Invalid ids")
+
+    if not restaurant_ids:
+        abort(400, "Missing ids")
+    max_batch_size = current_app.config["API_MAX_BATCH_SIZE"]
+    if len(restaurant_ids) > max_batch_size:
+        abort(400, f"At most {max_batch_size} ids may be requested")
+
+    menus = {restaurant_id: [] for restaurant_id in restaurant_ids}
+    rows = (
+        session.query(MenuItem.restaurant_id, *MenuItem.serialize_columns())
+        .filter(MenuItem.restaurant_id.in_(restaurant_ids))
+        .order_by(MenuItem.restaurant_id, MenuItem.id)
     )
+    for restaurant_id, *values in rows:
+        menus[restaurant_id].append(MenuItem.serialize_row(values))
+
     response = jsonify(
-        menu_items=[menu_item.serialize for menu_item in menu_items]
+        menus=[
+            {"restaurant_id": restaurant_id, "menu_items": menu_items}
+            for restaurant_id, menu_items in menus.items()
+        ]
     )
 
     return response
 
 
-@app.route("/api/restaurants/<int:restaurant_id>/menu/<int:menu_id>/")
-def menu_item_api(restaurant_id, menu_id):  # pylint: disable=unused-argument
+@bp.route("/api/restaurants/<int:restaurant_id>/menu/<int:menu_id>/")
+@query_budget(2)
+def menu_item_api(restaurant_id, menu_id):
     """Route handler for api endpoint retreiving a specific menu item.
 
     Args:
         restaurant_id: An int representing the id of the restaurant the given
-            menu item to be retrieved belongs to (unused)
+            menu item to be retrieved belongs to
         menu_item_id: An int representing the id of the menu item to be
             retrieved
 
     Returns:
         response: A json object containing the given menu item
     """
-    menu_item = session.query(MenuItem).filter_by(id=menu_id).one()
-    response = jsonify(menu_item=menu_item.serialize)
+    version = menu_item_version(menu_id)
+    tag = version_tag(version)
+
+    def serialize_menu_item():
+        key = ("menu_item_api", menu_id)
+        generation = menu_cache.generation
+        body = menu_cache.get(restaurant_id, key, tag)
+
+        if body is None:
+            menu_item = session.query(MenuItem).filter_by(id=menu_id).one()
+            body = jsonify(menu_item=menu_item.serialize).get_data()
+            # Only cache items under the restaurant they belong to, so the
+            # restaurant's invalidation covers them
+            if menu_item.restaurant_id == restaurant_id:
+                menu_cache.set(restaurant_id, key, body, generation, tag)
+                cache_compressed(restaurant_id, key, generation, tag)
+        else:
+            cache_compressed(restaurant_id, key, generation, tag)
+
+        return current_app.response_class(body, mimetype="application/json")
+
+    response = conditional_response(version, serialize_menu_item)
+
+    return response
+
+
+@bp.route("/api/restaurants/<int:restaurant_id>/", methods=["PATCH"])
+@query_budget(3)
+def restaurant_patch_api(restaurant_id):
+    """Route handler for api endpoint changing fields of a restaurant.
+
+    Accepts a json object with the fields to change, which are written with
+    a single UPDATE (bumping the restaurant's version) without loading the
+    restaurant first.
+
+    Args:
+        restaurant_id: An int representing the id of the restaurant to change
+
+    Returns:
+        response: An empty 204 response
+    """
+    try:
+        values = restaurant_values(request.get_json(silent=True))
+    except ValueError as error:
+        abort(400, str(error))
+
+    updated = (
+        session.query(Restaurant)
+        .filter_by(id=restaurant_id)
+        .update(
+            {
+                **values,
+                "version": Restaurant.version + 1,
+                "updated_at": datetime.utcnow(),
+            },
+            synchronize_session=False,
+        )
+    )
+    if not updated:
+        abort(404, "Restaurant not found")
+
+    refresh_snapshot(session, restaurant_id)
+    session.commit()
+    menu_cache.invalidate(restaurant_id)
+
+    response = current_app.response_class(status=204)
+
+    return response
+
+
+@bp.route(
+    "/api/restaurants/<int:restaurant_id>/menu/<int:menu_id>/",
+    methods=["PATCH"],
+)
+@query_budget(4)
+def menu_item_patch_api(restaurant_id, menu_id):
+    """Route handler for api endpoint changing fields of a menu item.
+
+    Accepts a json object with the fields to change (any of name, course,
+    description and price), which are written with a single UPDATE without
+    loading the menu item first.
+
+    Args:
+        restaurant_id: An int representing the id of the restaurant the given
+            menu item belongs to
+        menu_id: An int representing the id of the menu item to change
+
+    Returns:
+        response: An empty 204 response
+    """
+    try:
+        values = menu_item_values(request.get_json(silent=True), partial=True)
+    except ValueError as error:
+        abort(400, str(error))
+    if not values:
+        abort(400, "No fields to change")
+
+    updated = (
+        session.query(MenuItem)
+        .filter_by(id=menu_id, restaurant_id=restaurant_id)
+        .update(
+            {**values, "updated_at": datetime.utcnow()},
+            synchronize_session=False,
+        )
+    )
+    if not updated:
+        abort(404, "Menu item not found")
+
+    touch_restaurant(restaurant_id)
+    session.commit()
+    menu_cache.invalidate(restaurant_id)
+
+    response = current_app.response_class(status=204)
+
+    return response
+
+
+@bp.route("/api/export/")
+# Its query runs while the body is streamed, after budgets are checked
+@query_budget(None)
+def export_api():
+    """Route handler for api endpoint streaming the full catalog.
+
+    Every restaurant is written as one line of json (ndjson) with its menu
+    items nested under it. Rows are fetched from the db in batches while the
+    response is being sent, so memory use stays flat however large the
+    catalog is and the first restaurant is sent right away.
+
+    Returns:
+        response: A streamed ndjson response containing every restaurant and
+            its menu items
+    """
+    rows = (
+        session.query(
+            Restaurant.id,
+            Restaurant.name,
+            MenuItem.id,
+            MenuItem.name,
+            MenuItem.course,
+            MenuItem.description,
+            MenuItem.price_cents,
+        )
+        .outerjoin(MenuItem, MenuItem.restaurant_id == Restaurant.id)
+        .order_by(Restaurant.id, MenuItem.id)
+        .yield_per(current_app.config["EXPORT_BATCH_SIZE"])
+    )
+
+    def generate():
+        for (restaurant_id, name), group in groupby(rows, itemgetter(0, 1)):
+            restaurant = {
+                "id": restaurant_id,
+                "name": name,
+                "menu_items": [
+                    {
+                        "id": row[2],
+                        "name": row[3],
+                        "course": row[4],
+                        "description": row[5],
+                        "price": format_price(row[6]),
+                    }
+                    for row in group
+                    if row[2] is not None
+                ],
+            }
+            yield json.dumps(restaurant, separators=(",", ":")) + "\n"
+
+    response = Response(
+        stream_with_context(generate()), mimetype="application/x-ndjson"
+    )
+
+    return response
+
+
+@bp.route("/api/search/")
+@query_budget(1)
+def search_api():
+    """Route handler for api endpoint searching menu items by name and text.
+
+    Accepts a q query param with the words to search for, each matched as a
+    prefix of words in menu item names and descriptions, and an optional
+    limit query param.
+
+    Returns:
+        response: A json object containing the best matching menu items,
+            ranked by relevance, each with the restaurant it belongs to
+    """
+    terms = request.args.get("q", "").strip()
+    if not terms:
+        abort(400, "Missing q")
+
+    limit = request.args.get(
+        "limit", current_app.config["SEARCH_RESULTS_LIMIT"], type=int
+    )
+    limit = min(max(limit, 1), current_app.config["API_MAX_PAGE_SIZE"])
+    response = jsonify(menu_items=search(session, terms, limit))
+
+    return response
+
+
+@bp.route("/api/cache/")
+@query_budget(0)
+def cache_api():
+    """Route handler for api endpoint reporting the menu cache's counters.
+
+    Returns:
+        response: A json object containing the menu cache's size, hits,
+            misses and evictions
+    """
+    response = jsonify(menu_cache=menu_cache.stats)
+
+    return response
+
+
+@bp.route("/metrics")
+@query_budget(0)
+def metrics():
+    """Route handler for the metrics of this process, for prometheus.
+
+    Returns:
+        response: The request, db and template timings in prometheus' text
+            format
+    """
+    response = current_app.response_class(
+        current_app.extensions["metrics"].render(),
+        mimetype="text/plain; version=0.0.4",
+    )
 
     return response
 
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    create_app().run(debug=True)
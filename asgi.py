@@ -0,0 +1,611 @@
+"""An ASGI app serving the read endpoints with an async db driver.
+
+The most requested read endpoints are served by async views that wait on the
+db without holding a thread, so a single process can keep many more
+connections in flight. Each view runs inside a flask request context of the
+wrapped flask app, so request parsing, errors, ETags, the menu cache and
+templates are shared with it, and only the db access differs. Every other
+request (including all writes) is passed on to the flask app.
+
+Usage: uvicorn --factory asgi:create_asgi_app
+
+Classes:
+    FlaskSessionMiddleware()
+
+Functions:
+    create_asgi_app()
+"""
+
+import functools
+from contextlib import asynccontextmanager
+
+from asgiref.wsgi import WsgiToAsgi
+from flask import abort, current_app, jsonify, render_template, request
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.requests import HTTPConnection
+from starlette.responses import Response
+from starlette.routing import Mount, Route
+from werkzeug.exceptions import HTTPException
+
+from app import (
+    after_condition,
+    client_is_current,
+    course_order,
+    create_app,
+    group_by_course,
+    include_stats,
+    is_full_menu,
+    menu_stats_columns,
+    menu_version_tag,
+    next_page,
+    page_params,
+    page_version,
+    price_param,
+    serialize_with_stats,
+    set_validators,
+    validators,
+    version_tag,
+)
+from compression import cache_compressed
+from database import create_async_engine
+from models import SQLITE_INT_RANGE, MenuItem, MenuSnapshot, Restaurant
+
+
+async def paginate(db, statement, *keys):
+    """Applies keyset pagination to a select from the request's query params.
+
+    Works like app.paginate, for an async session.
+
+    Args:
+        db: A sqlalchemy AsyncSession to run the select with
+        statement: A sqlalchemy Select of the columns to paginate
+        keys: The columns to order the rows by, ending with the primary key
+            of the selected table
+
+    Returns:
+        rows: A list of the rows on the requested page
+        next_cursor: A str to pass as the after param to retrieve the next
+            page, or None if this is the last page
+    """
+    limit, values = page_params(keys)
+    statement = statement.order_by(*keys)
+
+    if limit is None:
+        return (await db.execute(statement)).all(), None
+
+    if values is not None:
+        statement = statement.where(after_condition(keys, values))
+
+    rows = (await db.execute(statement.limit(limit + 1))).all()
+    return next_page(rows, keys, limit)
+
+
+async def cached(restaurant_id, key, compute, version):
+    """Retrieves a value from the menu cache, computing it on a miss.
+
+    Works like MenuCache.get_or_set, for a coroutine function, and caches
+    the compressed bodies of the response alongside the value.
+
+    Args:
+        restaurant_id: An int representing the id of the restaurant
+        key: A hashable identifying the representation of the menu
+        compute: A coroutine function taking no arguments returning the value
+        version: A str identifying the current version of the data the
+            value is computed from
+
+    Returns:
+        value: The cached or newly computed value
+    """
+    menu_cache = current_app.extensions["menu_cache"]
+    generation = menu_cache.generation
+    cache_compressed(restaurant_id, key, generation, version)
+    value = menu_cache.get(restaurant_id, key, version)
+    if value is None:
+        value = await compute()
+        menu_cache.set(restaurant_id, key, value, generation, version)
+
+    return value
+
+
+async def catalog_version(db):
+    """Retrieves the version of the list of restaurants, as in app.
+
+    Args:
+        db: A sqlalchemy AsyncSession to query with
+
+    Returns:
+        tag: A str identifying the current state of the restaurants
+        updated_at: A datetime (utc) of the latest change, or None
+    """
+    result = await db.execute(
+        select(func.count(Restaurant.id), func.max(Restaurant.updated_at))
+    )
+    count, updated_at = result.one()
+    tag = f"{count}.{updated_at:%Y%m%d%H%M%S%f}" if updated_at else "0"
+
+    return tag, updated_at
+
+
+async def restaurant_version(db, restaurant_id):
+    """Retrieves the version of a restaurant's menu, as in app.
+
+    Args:
+        db: A sqlalchemy AsyncSession to query with
+        restaurant_id: An int representing the id of the restaurant
+
+    Returns:
+        A tuple of a str identifying the current state of the menu and the
+            datetime (utc) of its latest change, or None if the restaurant
+            doesn't exist
+    """
+    result = await db.execute(
+        select(Restaurant.version, Restaurant.updated_at).where(
+            Restaurant.id == restaurant_id
+        )
+    )
+    row = result.first()
+    if row is None:
+        return None
+
+    return (
+        menu_version_tag(restaurant_id, row.version, row.updated_at),
+        row.updated_at,
+    )
+
+
+async def menu_snapshot(db, restaurant_id):
+    """Retrieves the version and snapshot of a restaurant's menu, as in app.
+
+    Args:
+        db: A sqlalchemy AsyncSession to query with
+        restaurant_id: An int representing the id of the restaurant
+
+    Returns:
+        version: The version of the menu, as restaurant_version returns it
+        menu: A str of the json of the full menu, or None if the restaurant
+            has no up to date snapshot
+    """
+    result = await db.execute(
+        select(
+            Restaurant.version,
+            Restaurant.updated_at,
+            MenuSnapshot.version.label("snapshot_version"),
+            MenuSnapshot.menu,
+        )
+        .outerjoin(MenuSnapshot, MenuSnapshot.restaurant_id == Restaurant.id)
+        .where(Restaurant.id == restaurant_id)
+    )
+    row = result.first()
+    if row is None:
+        return None, None
+
+    version = (
+        menu_version_tag(restaurant_id, row.version, row.updated_at),
+        row.updated_at,
+    )
+    if row.snapshot_version != row.version:
+        return version, None
+
+    return version, row.menu
+
+
+async def menu_item_version(db, menu_item_id):
+    """Retrieves the version of a menu item, as in app.
+
+    Args:
+        db: A sqlalchemy AsyncSession to query with
+        menu_item_id: An int representing the id of the menu item
+
+    Returns:
+        A tuple of a str identifying the current state of the menu item and
+            the datetime (utc) of its latest change, or None if the menu item
+            doesn't exist
+    """
+    result = await db.execute(
+        select(MenuItem.updated_at).where(MenuItem.id == menu_item_id)
+    )
+    row = result.first()
+    if row is None or row.updated_at is None:
+        return None
+
+    return f"{menu_item_id}.{row.updated_at:%Y%m%d%H%M%S%f}", row.updated_at
+
+
+async def conditional_response(version, respond):
+    """Answers a GET with a 304 if the client's copy is still current.
+
+    Works like app.conditional_response, for a coroutine function.
+
+    Args:
+        version: A tuple of a str tag and a datetime (utc) as returned by the
+            *_version functions, or None to skip the check
+        respond: A coroutine function taking no arguments that builds the
+            full response
+
+    Returns:
+        response: A 304 response or the full response, with ETag and
+            Last-Modified headers set
+    """
+    if version is None:
+        return await respond()
+
+    etag, last_modified = validators(version)
+    if client_is_current(etag, last_modified):
+        response = current_app.response_class(status=304)
+    else:
+        response = current_app.make_response(await respond())
+
+    return set_validators(response, etag, last_modified)
+
+
+async def restaurants_api(db):
+    """Async view of app.restaurants_api.
+
+    Args:
+        db: A sqlalchemy AsyncSession to query with
+
+    Returns:
+        response: A json object containing all restaurants (or a page of
+            them) and the cursor for the next page
+    """
+    stats = include_stats()
+
+    async def serialize_restaurants():
+        if stats:
+            rows, next_cursor = await paginate(
+                db,
+                select(*Restaurant.serialize_columns(), *menu_stats_columns())
+                .outerjoin(MenuItem, MenuItem.restaurant_id == Restaurant.id)
+                .group_by(Restaurant.id),
+                Restaurant.id,
+            )
+            restaurants = [serialize_with_stats(row) for row in rows]
+        else:
+            rows, next_cursor = await paginate(
+                db, select(*Restaurant.serialize_columns()), Restaurant.id
+            )
+            restaurants = [Restaurant.serialize_row(row) for row in rows]
+
+        return jsonify(restaurants=restaurants, next=next_cursor)
+
+    response = await conditional_response(
+        await catalog_version(db), serialize_restaurants
+    )
+
+    return response
+
+
+async def menu_items_api(db, restaurant_id):
+    """Async view of app.menu_items_api.
+
+    Args:
+        db: A sqlalchemy AsyncSession to query with
+        restaurant_id: An int representing the id of the restaurant whose menu
+            items are to be retrieved
+
+    Returns:
+        response: A json object containing all menu items (or a page of them)
+            for a given restaurant and the cursor for the next page
+    """
+    min_price = price_param("min_price")
+    max_price = price_param("max_price")
+    sort = request.args.get("sort", "id")
+    if sort not in ("id", "price"):
+        abort(400, "Invalid sort")
+
+    async def serialize_menu():
+        statement = select(*MenuItem.serialize_columns()).where(
+            MenuItem.restaurant_id == restaurant_id
+        )
+        if min_price is not None:
+            statement = statement.where(MenuItem.price_cents >= min_price)
+        if max_price is not None:
+            statement = statement.where(MenuItem.price_cents <= max_price)
+
+        if sort == "price":
+            rows, next_cursor = await paginate(
+                db,
+                statement.where(MenuItem.price_cents.isnot(None)),
+                MenuItem.price_cents,
+                MenuItem.id,
+            )
+        else:
+            rows, next_cursor = await paginate(db, statement, MenuItem.id)
+
+        return jsonify(
+            menu_items=[MenuItem.serialize_row(row) for row in rows],
+            next=next_cursor,
+        ).get_data()
+
+    async def respond():
+        tag = version_tag(version)
+        if menu is None:
+            body = await cached(restaurant_id, key, serialize_menu, tag)
+        else:
+            body = menu
+            cache_compressed(
+                restaurant_id,
+                key,
+                current_app.extensions["menu_cache"].generation,
+                tag,
+            )
+        return current_app.response_class(body, mimetype="application/json")
+
+    key = (
+        "menu_items_api",
+        request.args.get("limit", type=int),
+        request.args.get("after"),
+        min_price,
+        max_price,
+        sort,
+    )
+    menu = None
+    if is_full_menu(key):
+        version, menu = await menu_snapshot(db, restaurant_id)
+    else:
+        version = await restaurant_version(db, restaurant_id)
+    response = await conditional_response(version, respond)
+
+    return response
+
+
+async def menu_item_api(db, restaurant_id, menu_id):
+    """Async view of app.menu_item_api.
+
+    Args:
+        db: A sqlalchemy AsyncSession to query with
+        restaurant_id: An int representing the id of the restaurant the given
+            menu item to be retrieved belongs to
+        menu_id: An int representing the id of the menu item to be retrieved
+
+    Returns:
+        response: A json object containing the given menu item
+    """
+    version = await menu_item_version(db, menu_id)
+    tag = version_tag(version)
+
+    async def serialize_menu_item():
+        key = ("menu_item_api", menu_id)
+        menu_cache = current_app.extensions["menu_cache"]
+        generation = menu_cache.generation
+        body = menu_cache.get(restaurant_id, key, tag)
+
+        if body is None:
+            menu_item = await db.get(MenuItem, menu_id)
+            if menu_item is None:
+                abort(404, "Menu item not found")
+            body = jsonify(menu_item=menu_item.serialize).get_data()
+            # Only cache items under the restaurant they belong to, so the
+            # restaurant's invalidation covers them
+            if menu_item.restaurant_id == restaurant_id:
+                menu_cache.set(restaurant_id, key, body, generation, tag)
+                cache_compressed(restaurant_id, key, generation, tag)
+        else:
+            cache_compressed(restaurant_id, key, generation, tag)
+
+        return current_app.response_class(body, mimetype="application/json")
+
+    response = await conditional_response(version, serialize_menu_item)
+
+    return response
+
+
+async def show_menu_items(db, restaurant_id):
+    """Async view of app.show_menu_items for visitors without flashes.
+
+    Args:
+        db: A sqlalchemy AsyncSession to query with
+        restaurant_id: An int representing the id of the restaurant whose menu
+            is to be displayed
+
+    Returns:
+        An html template with the given restaurant's menu displayed
+    """
+
+    async def render_menu():
+        restaurant = await db.get(Restaurant, restaurant_id)
+        if restaurant is None:
+            abort(404)
+        result = await db.execute(
+            select(MenuItem)
+            .where(MenuItem.restaurant_id == restaurant_id)
+            .order_by(course_order(), MenuItem.id)
+        )
+
+        return render_template(
+            "menu_items.html",
+            restaurant=restaurant,
+            courses=group_by_course(result.scalars()),
+        )
+
+    version = page_version(await restaurant_version(db, restaurant_id))
+    response = await conditional_response(
+        version,
+        lambda: cached(
+            restaurant_id,
+            "show_menu_items",
+            render_menu,
+            version_tag(version),
+        ),
+    )
+
+    return response
+
+
+def flask_endpoint(flask_app, view):
+    """Wraps an async view to run in a request context of the flask app.
+
+    The view is given an async session and the path params of the request,
+    and its return value is turned into a response by the flask app, which
+    also runs its before and after request hooks and error handlers.
+
+    Args:
+        flask_app: The flask app whose request context to use
+        view: A coroutine function taking an AsyncSession and the path params
+
+    Returns:
+        endpoint: A coroutine function taking a starlette Request and
+            returning a starlette Response
+    """
+
+    @functools.wraps(view)
+    async def endpoint(request_):
+        url = request_.url
+        with flask_app.test_request_context(
+            url.path,
+            base_url=f"{url.scheme}://{url.netloc}",
+            query_string=url.query,
+            method=request_.method,
+            headers=list(request_.headers.items()),
+        ):
+            try:
+                response = flask_app.preprocess_request()
+                # Ids sqlite can't store don't match, as in the flask app
+                if any(
+                    value not in SQLITE_INT_RANGE
+                    for value in request_.path_params.values()
+                ):
+                    abort(404)
+                if response is None:
+                    engine = flask_app.extensions["async_engine"]
+                    async with AsyncSession(engine) as db:
+                        response = await view(db, **request_.path_params)
+            except HTTPException as error:
+                response = flask_app.handle_http_exception(error)
+
+            response = flask_app.process_response(
+                flask_app.make_response(response)
+            )
+
+        asgi_response = Response(
+            response.get_data(), status_code=response.status_code
+        )
+        asgi_response.raw_headers = [
+            (name.lower().encode("latin-1"), value.encode("latin-1"))
+            for name, value in response.headers.items()
+        ]
+
+        return asgi_response
+
+    return endpoint
+
+
+class FlaskSessionMiddleware:  # pylint: disable=too-few-public-methods
+    """ASGI middleware passing requests with a flask session to the flask app.
+
+    Flashed messages are kept in the session cookie and rendered by the
+    flask views, which take them out of the session, so requests carrying
+    the cookie are sent to the flask app before the async routes are
+    dispatched.
+
+    Attributes:
+        app: The ASGI app serving requests without a session
+        flask_app: The ASGI app wrapping the flask app
+        cookie_name: A str representing the name of flask's session cookie
+    """
+
+    def __init__(self, app, flask_app, cookie_name):
+        """Wraps an ASGI app.
+
+        Args:
+            app: The ASGI app serving requests without a session
+            flask_app: The ASGI app wrapping the flask app
+            cookie_name: A str representing the name of flask's session
+                cookie
+        """
+        self.app = app
+        self.flask_app = flask_app
+        self.cookie_name = cookie_name
+
+    async def __call__(self, scope, receive, send):
+        """Serves a request with the app its session calls for.
+
+        Args:
+            scope: A dict describing the connection
+            receive: A coroutine function receiving the request's messages
+            send: A coroutine function sending the response's messages
+        """
+        if (
+            scope["type"] == "http"
+            and self.cookie_name in HTTPConnection(scope).cookies
+        ):
+            await self.flask_app(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+
+def create_asgi_app(config=None):
+    """Creates the ASGI app wrapping the flask app.
+
+    Args:
+        config: The class or object holding the app's configuration, as
+            taken by app.create_app
+
+    Returns:
+        asgi_app: A starlette app serving the read endpoints asynchronously
+            and passing all other requests to the flask app
+    """
+    flask_app = create_app(config)
+    flask_app.extensions["async_engine"] = create_async_engine(
+        flask_app.config
+    )
+    flask_app.extensions["metrics"].instrument_engine(
+        flask_app.extensions["async_engine"].sync_engine
+    )
+    wsgi_app = WsgiToAsgi(flask_app)
+
+    @asynccontextmanager
+    async def lifespan(asgi_app):  # pylint: disable=unused-argument
+        yield
+        await flask_app.extensions["async_engine"].dispose()
+        flask_app.extensions["engine"].dispose()
+        flask_app.extensions["read_engine"].dispose()
+
+    routes = [
+        Route(
+            "/api/restaurants/",
+            flask_endpoint(flask_app, restaurants_api),
+            methods=["GET"],
+        ),
+        Route(
+            "/api/restaurants/{restaurant_id:int}/",
+            flask_endpoint(flask_app, menu_items_api),
+            methods=["GET"],
+        ),
+        Route(
+            "/api/restaurants/{restaurant_id:int}/menu/",
+            flask_endpoint(flask_app, menu_items_api),
+            methods=["GET"],
+        ),
+        Route(
+            "/api/restaurants/{restaurant_id:int}/menu/{menu_id:int}/",
+            flask_endpoint(flask_app, menu_item_api),
+            methods=["GET"],
+        ),
+        Route(
+            "/restaurants/{restaurant_id:int}/menu/",
+            flask_endpoint(flask_app, show_menu_items),
+            methods=["GET"],
+        ),
+        Route(
+            "/restaurants/{restaurant_id:int}/",
+            flask_endpoint(flask_app, show_menu_items),
+            methods=["GET"],
+        ),
+        Mount("/", app=wsgi_app),
+    ]
+    middleware = [
+        Middleware(
+            FlaskSessionMiddleware,
+            flask_app=wsgi_app,
+            cookie_name=flask_app.config["SESSION_COOKIE_NAME"],
+        )
+    ]
+    asgi_app = Starlette(
+        routes=routes, middleware=middleware, lifespan=lifespan
+    )
+
+    return asgi_app
@@ -0,0 +1 @@
+"""Benchmarks for the restaurant menu app."""
@@ -0,0 +1,111 @@
+"""Measures how requests/sec scales with the number of client threads.
+
+A threaded WSGI server is started against a generated temporary db and
+hammered with GET requests from an increasing number of client threads.
+
+Usage: python -m benchmarks.concurrency [--threads 1 2 4 8] [--duration 5]
+"""
+
+import argparse
+import os
+import threading
+import time
+import urllib.request
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from benchmarks.generate import temporary_database
+
+PATHS = (
+    "/restaurants/",
+    "/restaurants/{restaurant_id}/menu/",
+    "/api/restaurants/",
+    "/api/restaurants/{restaurant_id}/menu/",
+)
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """A request handler that doesn't log every request to stderr."""
+
+    def log_request(self, *args, **kwargs):
+        """Skips logging so it doesn't skew the measurements."""
+
+
+def run(base_url, threads, duration, restaurants):
+    """Hammers the server from a number of threads for a fixed duration.
+
+    Args:
+        base_url: A str representing the url the server is listening on
+        threads: An int representing the number of client threads to use
+        duration: A float representing the number of seconds to run for
+        restaurants: An int representing the number of seeded restaurants
+
+    Returns:
+        A float representing the number of completed requests per second
+    """
+    counts = [0] * threads
+    deadline = time.perf_counter() + duration
+
+    def worker(index):
+        request_number = index
+        while time.perf_counter() < deadline:
+            path = PATHS[request_number % len(PATHS)].format(
+                restaurant_id=request_number % restaurants + 1
+            )
+            with urllib.request.urlopen(base_url + path) as response:
+                response.read()
+            counts[index] += 1
+            request_number += 1
+
+    workers = [
+        threading.Thread(target=worker, args=(index,))
+        for index in range(threads)
+    ]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+
+    return sum(counts) / (time.perf_counter() - start)
+
+
+def main():
+    """Generates a temporary db, starts the server and prints the results."""
+    parser = argparse.ArgumentParser(
+        description="Measures requests/sec by number of client threads."
+    )
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--duration", type=float, default=5)
+    parser.add_argument("--restaurants", type=int, default=20)
+    parser.add_argument("--menu-items", type=int, default=50)
+    args = parser.parse_args()
+
+    os.environ["DB_POOL_SIZE"] = str(max(args.threads))
+
+    with temporary_database(args.restaurants, args.menu_items):
+        from app import create_app
+
+        app = create_app()
+
+        server = make_server(
+            "127.0.0.1",
+            0,
+            app,
+            threaded=True,
+            request_handler=QuietRequestHandler,
+        )
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_port}"
+
+        print(f"{'threads':>8} {'req/s':>10}")
+        for threads in args.threads:
+            rate = run(base_url, threads, args.duration, args.restaurants)
+            print(f"{threads:>8} {rate:>10.1f}")
+
+        server.shutdown()
+        app.extensions["engine"].dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""Compares how many concurrent connections the WSGI and ASGI servers carry.
+
+The app is served from a subprocess, either by werkzeug's threaded WSGI
+server or by uvicorn running the ASGI app, against a generated temporary db
+with the menu cache disabled (unless MENU_CACHE_SIZE is set) so every
+request reaches the db. An increasing
+number of client connections then send the read endpoints' requests back to
+back, and the throughput, latency and failed requests are reported for each.
+
+Usage: python -m benchmarks.connections [--connections 10 50 200]
+    [--duration 5] [--servers wsgi asgi]
+
+Attributes:
+    PATHS: A tuple of the paths requested, formatted with a restaurant id
+        and a menu item id
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks.generate import temporary_database
+
+PATHS = (
+    "/api/restaurants/?limit=20",
+    "/api/restaurants/{restaurant_id}/menu/",
+    "/api/restaurants/{restaurant_id}/menu/{menu_item_id}/",
+    "/restaurants/{restaurant_id}/menu/",
+)
+
+
+def serve(server, port):
+    """Serves the app on a port until killed.
+
+    Args:
+        server: A str representing the server to use, wsgi or asgi
+        port: An int representing the port to listen on
+    """
+    if server == "wsgi":
+        from werkzeug.serving import make_server
+
+        from app import create_app
+        from benchmarks.concurrency import QuietRequestHandler
+
+        make_server(
+            "127.0.0.1",
+            port,
+            create_app(),
+            threaded=True,
+            request_handler=QuietRequestHandler,
+        ).serve_forever()
+    else:
+        import uvicorn
+
+        uvicorn.run(
+            "asgi:create_asgi_app",
+            factory=True,
+            host="127.0.0.1",
+            port=port,
+            log_level="warning",
+        )
+
+
+def free_port():
+    """Finds a port nothing is listening on.
+
+    Returns:
+        port: An int representing the port
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    return port
+
+
+def wait_for_server(port, timeout=30):
+    """Waits until a server accepts connections.
+
+    Args:
+        port: An int representing the port the server listens on
+        timeout: A float representing the number of seconds to wait
+
+    Raises:
+        RuntimeError: If the server didn't start in time
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+
+    raise RuntimeError(f"Server on port {port} didn't start")
+
+
+async def fetch(connection, port, path):
+    """Sends a GET request, reconnecting if the server closed the connection.
+
+    Args:
+        connection: A tuple of an asyncio StreamReader and StreamWriter, or
+            None to open a new connection
+        port: An int representing the port the server listens on
+        path: A str representing the path to request
+
+    Returns:
+        connection: The connection to reuse for the next request, or None if
+            the server closes it
+        status: An int representing the status code of the response
+    """
+    if connection is None:
+        connection = await asyncio.open_connection("127.0.0.1", port)
+    reader, writer = connection
+
+    writer.write(
+        f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\n\r\n".encode()
+    )
+    await writer.drain()
+
+    head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1")
+    status = int(head.split(" ", 2)[1])
+    headers = dict(
+        line.lower().split(": ", 1) for line in head.split("\r\n")[1:] if line
+    )
+    await reader.readexactly(int(headers.get("content-length", 0)))
+
+    if headers.get("connection") == "close" or head.startswith("HTTP/1.0"):
+        writer.close()
+        connection = None
+
+    return connection, status
+
+
+async def run(port, connections, duration, args):
+    """Sends requests over a number of concurrent connections.
+
+    Args:
+        port: An int representing the port the server listens on
+        connections: An int representing the number of connections
+        duration: A float representing the number of seconds to run for
+        args: The parsed command line arguments
+
+    Returns:
+        latencies: A list of floats representing the seconds each successful
+            request took
+        errors: An int representing the number of failed requests
+    """
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def client(index):
+        nonlocal errors
+        connection = None
+        request_number = index
+        while time.perf_counter() < deadline:
+            restaurant_id = request_number % args.restaurants + 1
+            path = PATHS[request_number % len(PATHS)].format(
+                restaurant_id=restaurant_id,
+                menu_item_id=(restaurant_id - 1) * args.menu_items + 1,
+            )
+            start = time.perf_counter()
+            try:
+                connection, status = await fetch(connection, port, path)
+            except (OSError, asyncio.IncompleteReadError):
+                connection, status = None, None
+
+            if status == 200:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+            request_number += 1
+
+    await asyncio.gather(*(client(index) for index in range(connections)))
+
+    return latencies, errors
+
+
+def main():
+    """Starts each server against a temporary db and prints the results."""
+    parser = argparse.ArgumentParser(
+        description="Compares concurrent connections of WSGI and ASGI."
+    )
+    parser.add_argument("--connections", type=int, nargs="+")
+    parser.add_argument("--duration", type=float, default=5)
+    parser.add_argument("--servers", nargs="+", default=["wsgi", "asgi"])
+    parser.add_argument("--restaurants", type=int, default=200)
+    parser.add_argument("--menu-items", type=int, default=50)
+    parser.add_argument("--serve", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port)
+        return
+
+    os.environ.setdefault("MENU_CACHE_SIZE", "0")
+
+    print(
+        f"{'server':>6} {'conns':>6} {'req/s':>9} {'p50 ms':>8} "
+        f"{'p99 ms':>8} {'errors':>7}"
+    )
+    with temporary_database(args.restaurants, args.menu_items):
+        for server in args.servers:
+            port = free_port()
+            process = subprocess.Popen(
+                [
+                    sys.executable,
+                    "-m",
+                    "benchmarks.connections",
+                    "--serve",
+                    server,
+                    "--port",
+                    str(port),
+                ]
+            )
+            try:
+                wait_for_server(port)
+                for connections in args.connections or [10, 50, 200]:
+                    latencies, errors = asyncio.run(
+                        run(port, connections, args.duration, args)
+                    )
+                    quantiles = statistics.quantiles(latencies, n=100)
+                    print(
+                        f"{server:>6} {connections:>6} "
+                        f"{len(latencies) / args.duration:>9.1f} "
+                        f"{quantiles[49] * 1000:>8.2f} "
+                        f"{quantiles[98] * 1000:>8.2f} {errors:>7}"
+                    )
+            finally:
+                process.terminate()
+                process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""Generates synthetic catalogs of restaurants and menus for benchmarking.
+
+Every restaurant gets the same number of menu items, with courses drawn from
+a skewed distribution (mostly entrees, few uncategorized items), names and
+descriptions built from a small vocabulary of dishes and ingredients, and
+prices spread between $1 and $50. The same seed always produces the same
+catalog.
+
+Usage: python -m benchmarks.generate [--restaurants 1000] [--menu-items 50]
+    [--seed 0] database_uri
+
+Attributes:
+    COURSE_WEIGHTS: A dict mapping each course (None for uncategorized) to
+        its relative frequency
+    ADJECTIVES: A tuple of words used in menu item names and descriptions
+    DISHES: A tuple of words used in menu item names
+    INGREDIENTS: A tuple of words used in menu item descriptions
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine
+
+COURSE_WEIGHTS = {
+    "Entree": 45,
+    "Appetizer": 25,
+    "Dessert": 15,
+    "Beverage": 10,
+    None: 5,
+}
+ADJECTIVES = (
+    "Crispy",
+    "Spicy",
+    "Grilled",
+    "Smoked",
+    "Roasted",
+    "Fresh",
+    "Sweet",
+    "Braised",
+    "Tangy",
+    "Creamy",
+)
+DISHES = (
+    "Burger",
+    "Salad",
+    "Noodles",
+    "Tacos",
+    "Soup",
+    "Pizza",
+    "Curry",
+    "Sandwich",
+    "Cake",
+    "Lemonade",
+    "Dumplings",
+    "Risotto",
+)
+INGREDIENTS = (
+    "chicken",
+    "tofu",
+    "mushrooms",
+    "garlic",
+    "basil",
+    "chocolate",
+    "lemon",
+    "pork",
+    "shrimp",
+    "cheese",
+    "peppers",
+    "ginger",
+)
+
+
+def generate(restaurants, menu_items, seed=0):
+    """Generates restaurants with their menu items.
+
+    Args:
+        restaurants: An int representing the number of restaurants
+        menu_items: An int representing the number of menu items for each
+            restaurant
+        seed: An int seeding the random number generator
+
+    Yields:
+        A tuple of the name of a restaurant and a list of dicts representing
+            its menu items, as accepted by bulk_load.load
+    """
+    rng = random.Random(seed)
+    courses = list(COURSE_WEIGHTS)
+    weights = list(COURSE_WEIGHTS.values())
+
+    for i in range(restaurants):
+        yield f"Restaurant {i}", [
+            {
+                "name": f"{rng.choice(ADJECTIVES)} {rng.choice(DISHES)}",
+                "course": course,
+                "description": (
+                    f"{rng.choice(ADJECTIVES)} {rng.choice(INGREDIENTS)} "
+                    f"with {rng.choice(INGREDIENTS)}"
+                ),
+                "price": f"${rng.randint(100, 5000) / 100:.2f}",
+            }
+            for course in rng.choices(courses, weights, k=menu_items)
+        ]
+
+
+def populate(database_uri, restaurants, menu_items, seed=0):
+    """Creates the schema of a db and fills it with a generated catalog.
+
+    Args:
+        database_uri: A str representing the sqlalchemy url of the db
+        restaurants: An int representing the number of restaurants
+        menu_items: An int representing the number of menu items for each
+            restaurant
+        seed: An int seeding the random number generator
+    """
+    # Imported here as config reads the environment when first imported,
+    # which temporary_database has to set up beforehand
+    import migrations
+    from bulk_load import load
+
+    engine = create_engine(database_uri)
+    migrations.upgrade(engine)
+    load(engine, generate(restaurants, menu_items, seed))
+    engine.dispose()
+
+
+@contextmanager
+def temporary_database(restaurants, menu_items, seed=0):
+    """Creates a generated db in a temporary directory for the app to use.
+
+    The DATABASE_URI environment variable is pointed at the db, so the app
+    (or anything importing config) must be imported inside the with block.
+
+    Args:
+        restaurants: An int representing the number of restaurants
+        menu_items: An int representing the number of menu items for each
+            restaurant
+        seed: An int seeding the random number generator
+
+    Yields:
+        database_uri: A str representing the sqlalchemy url of the db
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        database_uri = f"sqlite:///{os.path.join(tmp_dir, 'benchmark.db')}"
+        os.environ["DATABASE_URI"] = database_uri
+        populate(database_uri, restaurants, menu_items, seed)
+        yield database_uri
+
+
+def main():
+    """Generates a catalog into the db given on the command line."""
+    parser = argparse.ArgumentParser(
+        description="Generates a synthetic catalog."
+    )
+    parser.add_argument("database_uri")
+    parser.add_argument("--restaurants", type=int, default=1000)
+    parser.add_argument("--menu-items", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    populate(args.database_uri, args.restaurants, args.menu_items, args.seed)
+    print(
+        f"Generated {args.restaurants} restaurants with {args.menu_items} "
+        f"menu items each in {time.perf_counter() - start:.2f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Measures throughput of concurrent reads and writes under sqlite pragmas.
+
+Client threads share one app and each send a mix of menu reads and menu
+item updates, once with sqlite's defaults (a rollback journal synced on
+every commit) and once with the pragmas from the app's config (by default
+a write-ahead log synced at checkpoints). Each run gets a freshly generated
+db and the menu cache is disabled so every read hits the db.
+
+Usage: python -m benchmarks.mixed [--threads 8] [--duration 5]
+    [--write-ratio 0.2]
+
+Attributes:
+    SQLITE_DEFAULTS: A dict of config settings leaving sqlite's pragmas at
+        their defaults, as before they were configurable
+"""
+
+import argparse
+import random
+import threading
+import time
+
+from benchmarks.generate import temporary_database
+
+SQLITE_DEFAULTS = {
+    "SQLITE_JOURNAL_MODE": "delete",
+    "SQLITE_SYNCHRONOUS": "full",
+    "SQLITE_CACHE_SIZE": None,
+    "SQLITE_MMAP_SIZE": None,
+    "SQLITE_BUSY_TIMEOUT": None,
+    "SQLITE_TEMP_STORE": None,
+}
+
+
+def run(app, args):
+    """Sends reads and writes from a number of threads for a fixed duration.
+
+    Args:
+        app: The flask app to send requests to
+        args: The parsed command line arguments
+
+    Returns:
+        counts: A dict mapping reads, writes and errors to the number of
+            such requests completed
+    """
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.duration
+
+    def worker(seed):
+        client = app.test_client()
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            restaurant_id = rng.randint(1, args.restaurants)
+            if rng.random() < args.write_ratio:
+                kind = "writes"
+                menu_item_id = (restaurant_id - 1) * args.menu_items + 1
+                response = client.post(
+                    f"/api/restaurants/{restaurant_id}/menu/batch/",
+                    json={
+                        "update": [
+                            {
+                                "id": menu_item_id
+                                + rng.randrange(args.menu_items),
+                                "price": f"${rng.randint(100, 5000) / 100}",
+                            }
+                        ]
+                    },
+                )
+            else:
+                kind = "reads"
+                response = client.get(
+                    f"/api/restaurants/{restaurant_id}/menu/"
+                )
+
+            with lock:
+                counts[kind if response.status_code == 200 else "errors"] += 1
+
+    workers = [
+        threading.Thread(target=worker, args=(seed,))
+        for seed in range(args.threads)
+    ]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+
+    return counts
+
+
+def main():
+    """Runs the mix with and without the configured pragmas."""
+    parser = argparse.ArgumentParser(
+        description="Measures mixed read/write throughput by sqlite pragmas."
+    )
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=5)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--restaurants", type=int, default=200)
+    parser.add_argument("--menu-items", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'pragmas':>10} {'reads/s':>10} {'writes/s':>10} {'errors':>8}")
+    for name, settings in (("defaults", SQLITE_DEFAULTS), ("configured", {})):
+        with temporary_database(
+            args.restaurants, args.menu_items
+        ) as database_uri:
+            # Imported here as config reads the environment set up by
+            # temporary_database
+            from app import create_app
+            from config import Config
+
+            config = type(
+                "BenchmarkConfig",
+                (Config,),
+                {
+                    "DATABASE_URI": database_uri,
+                    "DB_POOL_SIZE": args.threads,
+                    "MENU_CACHE_SIZE": 0,
+                    **settings,
+                },
+            )
+            app = create_app(config)
+            app.logger.disabled = True
+            counts = run(app, args)
+            app.extensions["engine"].dispose()
+
+        print(
+            f"{name:>10} {counts['reads'] / args.duration:>10.1f} "
+            f"{counts['writes'] / args.duration:>10.1f} {counts['errors']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
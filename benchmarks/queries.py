@@ -0,0 +1,291 @@
+"""Checks every route runs a fixed number of sql queries, whatever its size.
+
+Each route is requested against two generated catalogs, one with small
+menus and one with large menus, with the menu cache disabled and query
+budgets raising errors. The check fails if a route exceeds its budget, runs
+a different number of queries for a larger menu (e.g. an N+1 query), has no
+budget or isn't requested here, so it can be run before every release.
+
+Usage: python -m benchmarks.queries [--menu-items 3 100] [--restaurants 10]
+
+Attributes:
+    BATCH_SIZES: A tuple of the numbers of menu items created by the batch
+        api requests, so a batch whose queries grow with its size fails
+    REQUESTS: A tuple of the method, url template and form or json body of
+        the requests made, covering every route
+"""
+
+import argparse
+import json
+import sys
+
+from benchmarks.generate import temporary_database
+
+BATCH_SIZES = (1, 20, 200)
+
+REQUESTS = (
+    ("GET", "/restaurants/", None),
+    ("GET", "/restaurants/?include=stats", None),
+    ("GET", "/restaurants/new/", None),
+    ("POST", "/restaurants/new/", {"name": "New Restaurant"}),
+    ("GET", "/restaurants/{restaurant_id}/edit/", None),
+    ("POST", "/restaurants/{restaurant_id}/edit/", {"name": "Renamed"}),
+    ("GET", "/restaurants/{restaurant_id}/delete/", None),
+    ("GET", "/restaurants/{restaurant_id}/menu/", None),
+    ("GET", "/restaurants/{restaurant_id}/menu/new/", None),
+    (
+        "POST",
+        "/restaurants/{restaurant_id}/menu/new/",
+        {"name": "New Item", "price": "$1.00"},
+    ),
+    ("GET", "/restaurants/{restaurant_id}/menu/{menu_item_id}/edit/", None),
+    (
+        "POST",
+        "/restaurants/{restaurant_id}/menu/{menu_item_id}/edit/",
+        {"price": "$2.00"},
+    ),
+    ("GET", "/restaurants/{restaurant_id}/menu/{menu_item_id}/delete/", None),
+    ("GET", "/api/restaurants/", None),
+    ("GET", "/api/restaurants/?limit=5", None),
+    ("GET", "/api/restaurants/?include=stats&limit=5", None),
+    ("GET", "/api/restaurants/{restaurant_id}/menu/", None),
+    ("GET", "/api/restaurants/{restaurant_id}/menu/?sort=price&limit=5", None),
+    ("GET", "/api/restaurants/{restaurant_id}/menu/{menu_item_id}/", None),
+    # Updates changing different fields, which must still be one statement
+    # (one each would go over the budget)
+    (
+        "POST",
+        "/api/restaurants/{restaurant_id}/menu/batch/",
+        {
+            "json": {
+                "create": [{"name": "Batch Item"}],
+                "update": [
+                    {"id": "{menu_item_id}", "name": "Renamed Item"},
+                    {
+                        "id": "{other_menu_item_id}",
+                        "price": "$3.00",
+                        "description": None,
+                    },
+                    {
+                        "id": "{third_menu_item_id}",
+                        "course": "Dessert",
+                        "name": "Dessert Item",
+                    },
+                ],
+            }
+        },
+    ),
+    (
+        "POST",
+        "/api/restaurants/{restaurant_id}/menu/batch/",
+        {
+            "json": {
+                "create": [{"name": "Batch Item"}],
+                "update": [{"id": "{menu_item_id}", "price": "$3.00"}],
+                "delete": ["{other_menu_item_id}"],
+            }
+        },
+    ),
+    *(
+        (
+            "POST",
+            "/api/restaurants/{restaurant_id}/menu/batch/",
+            {
+                "json": {
+                    "create": [
+                        {"name": f"Batch Item {index}", "price": "$3.00"}
+                        for index in range(size)
+                    ]
+                }
+            },
+        )
+        for size in BATCH_SIZES
+    ),
+    (
+        "PATCH",
+        "/api/restaurants/{restaurant_id}/",
+        {"json": {"name": "Patched"}},
+    ),
+    (
+        "PATCH",
+        "/api/restaurants/{restaurant_id}/menu/{menu_item_id}/",
+        {"json": {"price": "$4.00"}},
+    ),
+    ("GET", "/api/menus/?ids=1,2,3,4,5", None),
+    ("GET", "/api/search/?q=spicy", None),
+    ("GET", "/api/export/", None),
+    ("GET", "/api/cache/", None),
+    ("GET", "/metrics", None),
+    (
+        "POST",
+        "/restaurants/{restaurant_id}/menu/{menu_item_id}/delete/",
+        {},
+    ),
+    ("POST", "/restaurants/{restaurant_id}/delete/", {}),
+)
+
+
+def request_kwargs(body, menu_item_id):
+    """Builds the test client arguments sending a request's body.
+
+    Args:
+        body: A dict of form fields, a dict with a json key holding the json
+            body (with "{menu_item_id}", "{other_menu_item_id}" and
+            "{third_menu_item_id}" standing for the ids of three of the
+            restaurant's menu items), or None
+        menu_item_id: An int representing the id of the menu item requested
+
+    Returns:
+        A dict of keyword arguments for the test client's open method
+    """
+    if body is None:
+        return {}
+    if "json" not in body:
+        return {"data": body}
+
+    json_body = (
+        json.dumps(body["json"])
+        .replace('"{menu_item_id}"', str(menu_item_id))
+        .replace('"{other_menu_item_id}"', str(menu_item_id + 1))
+        .replace('"{third_menu_item_id}"', str(menu_item_id + 2))
+    )
+    return {"data": json_body, "content_type": "application/json"}
+
+
+def request_name(method, url, body):
+    """Names a request in the report.
+
+    Args:
+        method: A str representing the http method of the request
+        url: A str representing the url template of the request
+        body: The request's body, as in REQUESTS
+
+    Returns:
+        name: A str of the method and url, with the number of each kind of
+            change for batch requests
+    """
+    name = f"{method} {url}"
+    if body is not None and "/batch/" in url:
+        changes = ", ".join(
+            f"{len(body['json'][change])} {change}"
+            for change in ("create", "update", "delete")
+            if change in body["json"]
+        )
+        name += f" ({changes})"
+
+    return name
+
+
+def count_queries(app, menu_items):
+    """Requests every route once and reads the number of queries it ran.
+
+    Args:
+        app: The flask app to request, with query budgets raising errors
+        menu_items: An int representing the number of menu items for each
+            restaurant
+
+    Returns:
+        counts: A dict mapping the name of each request to the number of
+            queries it ran, or to the error it raised
+    """
+    # Pick the second restaurant so the first one is left for delete
+    restaurant_id = 2
+    menu_item_id = (restaurant_id - 1) * menu_items + 1
+    counts = {}
+
+    for method, url, body in REQUESTS:
+        name = request_name(method, url, body)
+        path = url.format(
+            restaurant_id=restaurant_id, menu_item_id=menu_item_id
+        )
+        # A new client per request so no flashed messages change the route
+        client = app.test_client()
+        try:
+            response = client.open(
+                path, method=method, **request_kwargs(body, menu_item_id)
+            )
+        except Exception as error:  # pylint: disable=broad-except
+            counts[name] = str(error)
+            continue
+
+        if response.status_code >= 400:
+            counts[name] = f"status {response.status_code}"
+        else:
+            counts[name] = int(response.headers["X-Query-Count"])
+
+    return counts
+
+
+def unchecked_endpoints(app):
+    """Finds the routes that have no budget or aren't requested here.
+
+    Args:
+        app: The flask app to check
+
+    Returns:
+        A sorted list of strs describing the routes not checked
+    """
+    adapter = app.url_map.bind("localhost")
+    requested = {
+        adapter.match(
+            url.split("?")[0].format(restaurant_id=1, menu_item_id=1), method
+        )[0]
+        for method, url, _ in REQUESTS
+    }
+    unchecked = []
+    for endpoint, view in app.view_functions.items():
+        if endpoint == "static":
+            continue
+        if not hasattr(view, "query_budget"):
+            unchecked.append(f"{endpoint} has no query budget")
+        if endpoint not in requested:
+            unchecked.append(f"{endpoint} isn't requested")
+
+    return sorted(unchecked)
+
+
+def main():
+    """Counts every route's queries for each menu size and reports them."""
+    parser = argparse.ArgumentParser(
+        description="Checks the number of queries each route runs."
+    )
+    parser.add_argument("--menu-items", type=int, nargs=2, default=[3, 100])
+    parser.add_argument("--restaurants", type=int, default=10)
+    args = parser.parse_args()
+
+    results = []
+    for menu_items in args.menu_items:
+        with temporary_database(args.restaurants, menu_items) as database_uri:
+            # Imported here as config reads the environment set up by
+            # temporary_database
+            from app import create_app
+            from config import TestingConfig
+
+            config = type(
+                "QueriesConfig",
+                (TestingConfig,),
+                {
+                    "DATABASE_URI": database_uri,
+                    "MENU_CACHE_SIZE": 0,
+                    "QUERY_BUDGET_MODE": "raise",
+                },
+            )
+            app = create_app(config)
+            results.append(count_queries(app, menu_items))
+            app.extensions["engine"].dispose()
+
+    failures = unchecked_endpoints(app)
+    small, large = results
+    print(f"{'request':<84} {'small':>6} {'large':>6}")
+    for route, count in small.items():
+        print(f"{route:<84} {count!s:>6} {large[route]!s:>6}")
+        if not isinstance(count, int) or count != large[route]:
+            failures.append(f"{route}: {count} vs {large[route]} queries")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
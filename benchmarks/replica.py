@@ -0,0 +1,177 @@
+"""Checks reads and writes are routed to their engines and compares them.
+
+The check runs the app against two sqlite files, a generated db and a
+replica synced from it, and verifies that GET requests read from the
+replica, that POST requests write to the db and not the replica, that a
+sync brings the replica up to date and that the read engine refuses writes.
+
+The same mix of concurrent menu reads and menu item updates as in
+benchmarks.mixed is then sent with reads on the writer engine, on a
+read-only connection to the db (the default) and on the replica, and the
+reads/sec, writes/sec and failed requests of each are reported.
+
+Usage: python -m benchmarks.replica [--threads 8] [--duration 5]
+    [--write-ratio 0.2]
+
+Attributes:
+    READS: A tuple of the names of the ways reads are served
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+from contextlib import closing
+
+from benchmarks.generate import temporary_database
+from benchmarks.mixed import run
+from replica import sqlite_path, sync_replica
+
+READS = ("writer", "read-only", "replica")
+
+
+def restaurant_name(path):
+    """Reads the name of the first restaurant straight from a db file.
+
+    Args:
+        path: A str representing the path of the db's file
+
+    Returns:
+        A str of the restaurant's name
+    """
+    with closing(sqlite3.connect(path)) as connection:
+        return connection.execute(
+            "SELECT name FROM restaurants WHERE id = 1"
+        ).fetchone()[0]
+
+
+def check_routing(app, database_path, replica_path):
+    """Checks where requests read and write, with the replica just synced.
+
+    Args:
+        app: The flask app, reading from the replica
+        database_path: A str representing the path of the db's file
+        replica_path: A str representing the path of the replica's file
+
+    Returns:
+        failures: A list of strs describing the checks that failed
+    """
+    from database import session
+
+    client = app.test_client()
+    failures = []
+
+    def api_name():
+        return client.get("/api/restaurants/?limit=1").get_json()[
+            "restaurants"
+        ][0]["name"]
+
+    with closing(sqlite3.connect(database_path)) as connection:
+        connection.execute(
+            "UPDATE restaurants SET name = 'Direct' WHERE id = 1"
+        )
+        connection.commit()
+    if api_name() == "Direct":
+        failures.append("GET read a write that isn't on the replica yet")
+
+    client.post("/restaurants/1/edit/", data={"name": "Posted"})
+    if restaurant_name(database_path) != "Posted":
+        failures.append("POST didn't write to the db")
+    if restaurant_name(replica_path) == "Posted":
+        failures.append("POST wrote to the replica")
+
+    sync_replica(database_path, replica_path)
+    if api_name() != "Posted":
+        failures.append("GET didn't read the synced replica")
+
+    with app.test_request_context("/"):
+        try:
+            session.execute(
+                "UPDATE restaurants SET name = 'Read engine' WHERE id = 1"
+            )
+            failures.append("The read engine accepted a write")
+        except Exception:  # pylint: disable=broad-except
+            pass
+        session.remove()
+
+    return failures
+
+
+def create_benchmark_app(database_uri, reads, replica_uri, args):
+    """Creates the app reading from one of the ways reads are served.
+
+    Args:
+        database_uri: A str representing the url of the db
+        reads: A str representing where reads are served from, one of READS
+        replica_uri: A str representing the url of the replica
+        args: The parsed command line arguments
+
+    Returns:
+        app: The flask app
+    """
+    from app import create_app
+    from config import Config
+
+    config = type(
+        "BenchmarkConfig",
+        (Config,),
+        {
+            "DATABASE_URI": database_uri,
+            "READ_DATABASE_URI": replica_uri if reads == "replica" else None,
+            "DB_POOL_SIZE": args.threads,
+            "MENU_CACHE_SIZE": 0,
+        },
+    )
+    app = create_app(config)
+    if reads == "writer":
+        app.extensions["read_engine"].dispose()
+        app.extensions["read_engine"] = app.extensions["engine"]
+    app.logger.disabled = True
+
+    return app
+
+
+def main():
+    """Checks the routing, then runs the mix for each way reads are served."""
+    parser = argparse.ArgumentParser(
+        description="Checks read/write routing and compares read engines."
+    )
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=5)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--restaurants", type=int, default=200)
+    parser.add_argument("--menu-items", type=int, default=50)
+    args = parser.parse_args()
+
+    failures = []
+    print(f"{'reads':>10} {'reads/s':>10} {'writes/s':>10} {'errors':>8}")
+    for reads in READS:
+        with temporary_database(
+            args.restaurants, args.menu_items
+        ) as database_uri:
+            database_path = sqlite_path(database_uri)
+            replica_path = os.path.join(
+                os.path.dirname(database_path), "replica.db"
+            )
+            sync_replica(database_path, replica_path)
+            replica_uri = f"sqlite:///{replica_path}"
+
+            app = create_benchmark_app(database_uri, reads, replica_uri, args)
+            if reads == "replica":
+                failures = check_routing(app, database_path, replica_path)
+            counts = run(app, args)
+            app.extensions["engine"].dispose()
+            app.extensions["read_engine"].dispose()
+
+        print(
+            f"{reads:>10} {counts['reads'] / args.duration:>10.1f} "
+            f"{counts['writes'] / args.duration:>10.1f} {counts['errors']:>8}"
+        )
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""Benchmarks every route of the app through flask's test client.
+
+A generated catalog is loaded into a temporary db and each route is requested
+a number of times with varying ids. Latency percentiles and throughput are
+printed per route and saved as json, named after the current git commit, so
+runs can be compared across commits.
+
+Usage: python -m benchmarks.routes [--restaurants 1000] [--menu-items 50]
+    [--requests 200] [--no-cache] [--output FILE] [--compare FILE]
+
+Attributes:
+    EDIT: A dict of the form sent to the routes editing with a form
+    ROUTES: A tuple of the method, url template and form or json body of
+        each route benchmarked. Each request to a route deleting something
+        is made with a different restaurant, so requests must not exceed
+        restaurants.
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import time
+
+from benchmarks.generate import temporary_database
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+EDIT = {"data": {"description": "An updated description"}}
+
+ROUTES = (
+    ("GET", "/restaurants/", None),
+    ("GET", "/restaurants/new/", None),
+    ("POST", "/restaurants/new/", {"data": {"name": "New Restaurant"}}),
+    ("GET", "/restaurants/{restaurant_id}/edit/", None),
+    ("POST", "/restaurants/{restaurant_id}/edit/", EDIT),
+    ("GET", "/restaurants/{restaurant_id}/delete/", None),
+    ("GET", "/restaurants/{restaurant_id}/menu/", None),
+    ("GET", "/restaurants/{restaurant_id}/menu/new/", None),
+    (
+        "POST",
+        "/restaurants/{restaurant_id}/menu/new/",
+        {"data": {"name": "New Item", "course": "Dessert", "price": "$2"}},
+    ),
+    ("GET", "/restaurants/{restaurant_id}/menu/{menu_item_id}/edit/", None),
+    ("POST", "/restaurants/{restaurant_id}/menu/{menu_item_id}/edit/", EDIT),
+    ("GET", "/restaurants/{restaurant_id}/menu/{menu_item_id}/delete/", None),
+    ("GET", "/api/restaurants/", None),
+    ("GET", "/api/restaurants/?limit=100", None),
+    ("GET", "/api/restaurants/{restaurant_id}/menu/", None),
+    ("GET", "/api/restaurants/{restaurant_id}/menu/?limit=10", None),
+    ("GET", "/api/restaurants/{restaurant_id}/menu/{menu_item_id}/", None),
+    ("GET", "/api/menus/?ids=" + ",".join(map(str, range(1, 51))), None),
+    ("GET", "/api/search/?q=spicy", None),
+    ("GET", "/api/export/", None),
+    ("GET", "/api/cache/", None),
+    ("GET", "/metrics", None),
+    (
+        "POST",
+        "/api/restaurants/{restaurant_id}/menu/batch/",
+        {
+            "json": {
+                "create": [
+                    {"name": f"Batch Item {index}", "price": "$4.00"}
+                    for index in range(20)
+                ]
+            }
+        },
+    ),
+    (
+        "PATCH",
+        "/api/restaurants/{restaurant_id}/",
+        {"json": {"name": "Patched"}},
+    ),
+    (
+        "PATCH",
+        "/api/restaurants/{restaurant_id}/menu/{menu_item_id}/",
+        {"json": {"price": "$4.50"}},
+    ),
+    # Deletes come last, as they remove what the other routes request
+    ("POST", "/restaurants/{restaurant_id}/menu/{menu_item_id}/delete/", {}),
+    ("POST", "/restaurants/{restaurant_id}/delete/", {}),
+)
+
+
+def percentile(latencies, percent):
+    """Computes a percentile of a list of latencies.
+
+    Args:
+        latencies: A list of floats representing latencies in seconds
+        percent: An int between 1 and 99 representing the percentile
+
+    Returns:
+        A float representing the percentile in milliseconds
+    """
+    return statistics.quantiles(latencies, n=100)[percent - 1] * 1000
+
+
+def benchmark_route(
+    client, route, requests, restaurants, menu_items
+):  # pylint: disable=too-many-locals
+    """Requests a route repeatedly and summarizes its latency.
+
+    Args:
+        client: A flask test client for the app
+        route: A tuple of the http method, url template and form or json
+            body (or None) of the route
+        requests: An int representing the number of requests to make
+        restaurants: An int representing the number of restaurants in the db
+        menu_items: An int representing the number of menu items per
+            restaurant
+
+    Returns:
+        result: A dict of the route's latency percentiles and throughput
+    """
+    method, url, body = route
+    rng = random.Random(0)
+    if url.endswith("/delete/") and method == "POST":
+        restaurant_ids = rng.sample(range(1, restaurants + 1), requests)
+    else:
+        restaurant_ids = [rng.randint(1, restaurants) for _ in range(requests)]
+
+    latencies = []
+    for restaurant_id in restaurant_ids:
+        menu_item_id = (restaurant_id - 1) * menu_items + rng.randint(
+            1, menu_items
+        )
+        path = url.format(
+            restaurant_id=restaurant_id, menu_item_id=menu_item_id
+        )
+
+        start = time.perf_counter()
+        response = client.open(path, method=method, **(body or {}))
+        response.get_data()
+        latencies.append(time.perf_counter() - start)
+
+        if response.status_code >= 400:
+            raise RuntimeError(f"{method} {path}: {response.status_code}")
+
+    result = {
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "requests_per_second": requests / sum(latencies),
+    }
+    return result
+
+
+def git_commit():
+    """Retrieves the short hash of the current git commit.
+
+    Returns:
+        A str representing the commit, or "unknown" outside a git checkout
+    """
+    try:
+        output = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+    return output.stdout.strip()
+
+
+def print_results(results, baseline=None):
+    """Prints a table of results, optionally against an earlier run.
+
+    Args:
+        results: A dict mapping each route to its result
+        baseline: A dict of results of an earlier run to compare with
+    """
+    print(f"{'route':<60} {'p50':>8} {'p95':>8} {'p99':>8} {'req/s':>9}")
+    for route, result in results.items():
+        line = (
+            f"{route:<60} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} "
+            f"{result['p99_ms']:>8.2f} {result['requests_per_second']:>9.1f}"
+        )
+        if baseline and route in baseline:
+            before = baseline[route]["requests_per_second"]
+            change = result["requests_per_second"] / before - 1
+            line += f" {change:>+8.1%}"
+        print(line)
+
+
+def main():
+    """Runs the benchmark and saves the results."""
+    parser = argparse.ArgumentParser(description="Benchmarks every route.")
+    parser.add_argument("--restaurants", type=int, default=1000)
+    parser.add_argument("--menu-items", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--output")
+    parser.add_argument("--compare")
+    args = parser.parse_args()
+
+    if args.no_cache:
+        os.environ["MENU_CACHE_SIZE"] = "0"
+
+    with temporary_database(args.restaurants, args.menu_items):
+        from app import create_app
+
+        client = create_app().test_client()
+        results = {
+            f"{route[0]} {route[1]}": benchmark_route(
+                client,
+                route,
+                args.requests,
+                args.restaurants,
+                args.menu_items,
+            )
+            for route in ROUTES
+        }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+    print_results(results, baseline)
+
+    commit = git_commit()
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as output_file:
+        json.dump(
+            {"commit": commit, "arguments": vars(args), "results": results},
+            output_file,
+            indent=2,
+        )
+    print(f"Saved results to {output}")
+
+
+if __name__ == "__main__":
+    main()
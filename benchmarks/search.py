@@ -0,0 +1,137 @@
+"""Compares full-text menu search against a LIKE scan of menu items.
+
+Both run against the same generated catalog: the fts5 query used by the
+search api and the equivalent scan over names and descriptions, with one
+`LIKE '%word%'` per word of the search ANDed together as the fts5 query
+requires every word, each limited to the same number of results. The LIKE
+scan is unranked and stops at the first matches, so it is only competitive
+for very common words; rare words make it read the whole table, while the
+fts5 query only ever touches matching rows (and ranks all of them).
+
+Usage: python -m benchmarks.search [--restaurants 2000] [--menu-items 50]
+    [--repeat 20]
+
+Attributes:
+    TERMS: A tuple of the searches to benchmark
+    LIKE_SQL: A str of the LIKE scan, formatted with its conditions
+    LIKE_CONDITION: A str of the condition matching one word, formatted with
+        the index of its pattern
+"""
+
+import argparse
+import re
+import time
+
+from sqlalchemy import create_engine, text
+
+from benchmarks.generate import temporary_database
+
+TERMS = ("burger", "spicy noodles", "chocolate", "ginger shrimp", "zucchini")
+
+LIKE_SQL = """
+    SELECT
+        menu_items.id,
+        menu_items.name,
+        menu_items.course,
+        menu_items.description,
+        menu_items.price_cents,
+        restaurants.id AS restaurant_id,
+        restaurants.name AS restaurant_name
+    FROM menu_items
+    JOIN restaurants ON restaurants.id = menu_items.restaurant_id
+    WHERE {conditions}
+    LIMIT :limit
+    """
+
+LIKE_CONDITION = """(menu_items.name LIKE :pattern_{index}
+        OR menu_items.description LIKE :pattern_{index})"""
+
+
+def like_query(terms):
+    """Builds the LIKE scan equivalent to the fts5 query of a search.
+
+    Like match_query, every word of the search must appear (in the name or
+    the description), so both return the same kind of matches.
+
+    Args:
+        terms: A str representing the search
+
+    Returns:
+        A tuple of the sqlalchemy TextClause and a dict of its patterns
+    """
+    words = re.findall(r"\w+", terms)
+    conditions = "\n    AND ".join(
+        LIKE_CONDITION.format(index=index) for index in range(len(words))
+    )
+    patterns = {
+        f"pattern_{index}": f"%{word}%" for index, word in enumerate(words)
+    }
+
+    return text(LIKE_SQL.format(conditions=conditions)), patterns
+
+
+def time_query(run, repeat):
+    """Times a query function over several runs.
+
+    Args:
+        run: A function taking no arguments that runs the query
+        repeat: An int representing the number of runs
+
+    Returns:
+        A tuple of the mean latency in milliseconds and the number of rows
+            returned by the last run
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        rows = run()
+    elapsed = time.perf_counter() - start
+
+    return elapsed / repeat * 1000, len(rows)
+
+
+def main():
+    """Generates a catalog and prints the latency of both approaches."""
+    parser = argparse.ArgumentParser(
+        description="Compares full-text search with a LIKE scan."
+    )
+    parser.add_argument("--restaurants", type=int, default=2000)
+    parser.add_argument("--menu-items", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    with temporary_database(args.restaurants, args.menu_items) as uri:
+        from search import SEARCH_SQL, match_query
+
+        engine = create_engine(uri)
+        with engine.connect() as connection:
+            print(
+                f"{'search':<16} {'fts ms':>9} {'rows':>5} "
+                f"{'like ms':>9} {'rows':>5} {'speedup':>8}"
+            )
+            for terms in TERMS:
+                like_sql, patterns = like_query(terms)
+                fts_ms, fts_rows = time_query(
+                    lambda: connection.execute(
+                        SEARCH_SQL,
+                        {"query": match_query(terms), "limit": args.limit},
+                    ).fetchall(),
+                    args.repeat,
+                )
+                like_ms, like_rows = time_query(
+                    lambda: connection.execute(
+                        like_sql,
+                        {**patterns, "limit": args.limit},
+                    ).fetchall(),
+                    args.repeat,
+                )
+                print(
+                    f"{terms:<16} {fts_ms:>9.2f} {fts_rows:>5} "
+                    f"{like_ms:>9.2f} {like_rows:>5} "
+                    f"{like_ms / fts_ms:>7.1f}x"
+                )
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
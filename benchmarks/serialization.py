@@ -0,0 +1,177 @@
+"""Compares the ways of serializing the list endpoints of the json api.
+
+The full list of restaurants and a restaurant's full menu are each built
+three ways from the same generated catalog: from ORM objects encoded with
+flask's default json provider (as the api used to), from selected column
+rows encoded with the default provider, and from rows encoded with orjson
+(if installed) as the api now does. Every way must give the same json, and
+the mean time of each, with its speedup over the first, is reported.
+
+Usage: python -m benchmarks.serialization [--restaurants 2000]
+    [--menu-items 500] [--repeat 20]
+
+Attributes:
+    WAYS: A tuple of the name, model query and json provider of each way
+"""
+
+import argparse
+import json
+import sys
+import time
+
+from flask.json.provider import DefaultJSONProvider
+
+from benchmarks.generate import temporary_database
+from database import session
+from json_provider import FastJSONProvider, orjson
+
+WAYS = (
+    ("orm + json", "objects", DefaultJSONProvider),
+    ("rows + json", "rows", DefaultJSONProvider),
+    ("rows + orjson", "rows", FastJSONProvider),
+)
+
+
+def restaurants_list(session, model, query):
+    """Serializes every restaurant as the restaurants api does.
+
+    Args:
+        session: A sqlalchemy Session to query with
+        model: The Restaurant model
+        query: A str representing how to query, objects or rows
+
+    Returns:
+        A dict to encode as the response
+    """
+    if query == "objects":
+        restaurants = session.query(model).order_by(model.id)
+        return {
+            "restaurants": [
+                restaurant.serialize for restaurant in restaurants
+            ],
+            "next": None,
+        }
+
+    rows = session.query(*model.serialize_columns()).order_by(model.id)
+    return {
+        "restaurants": [model.serialize_row(row) for row in rows],
+        "next": None,
+    }
+
+
+def menu(session, model, query, restaurant_id):
+    """Serializes a restaurant's menu as the menu items api does.
+
+    Args:
+        session: A sqlalchemy Session to query with
+        model: The MenuItem model
+        query: A str representing how to query, objects or rows
+        restaurant_id: An int representing the id of the restaurant
+
+    Returns:
+        A dict to encode as the response
+    """
+    if query == "objects":
+        menu_items = (
+            session.query(model)
+            .filter_by(restaurant_id=restaurant_id)
+            .order_by(model.id)
+        )
+        return {
+            "menu_items": [menu_item.serialize for menu_item in menu_items],
+            "next": None,
+        }
+
+    rows = (
+        session.query(*model.serialize_columns())
+        .filter(model.restaurant_id == restaurant_id)
+        .order_by(model.id)
+    )
+    return {
+        "menu_items": [model.serialize_row(row) for row in rows],
+        "next": None,
+    }
+
+
+def time_way(app, build, query, provider, repeat):
+    """Times building and encoding a response one way.
+
+    Args:
+        app: The flask app, for its session and response class
+        build: A function taking a session and a query str and returning the
+            dict to encode
+        query: A str representing how to query, objects or rows
+        provider: The flask json provider class to encode with
+        repeat: An int representing the number of runs
+
+    Returns:
+        A tuple of the mean time in milliseconds and the encoded body
+    """
+    json_provider = provider(app)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        body = json_provider.response(build(session, query)).get_data()
+        # Start every run with an empty identity map, as a request would
+        session.remove()
+    elapsed = time.perf_counter() - start
+
+    return elapsed / repeat * 1000, body
+
+
+def main():
+    """Times each way of serializing both endpoints and prints the results."""
+    parser = argparse.ArgumentParser(
+        description="Compares the serialization of the json api."
+    )
+    parser.add_argument("--restaurants", type=int, default=2000)
+    parser.add_argument("--menu-items", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    if orjson is None:
+        print("orjson isn't installed, rows + orjson uses json instead")
+
+    with temporary_database(args.restaurants, args.menu_items):
+        # Imported here as the app reads the environment set up by
+        # temporary_database
+        from app import create_app
+        from models import MenuItem, Restaurant
+
+        app = create_app()
+        endpoints = (
+            (
+                f"{args.restaurants} restaurants",
+                lambda session, query: restaurants_list(
+                    session, Restaurant, query
+                ),
+            ),
+            (
+                f"menu of {args.menu_items}",
+                lambda session, query: menu(session, MenuItem, query, 1),
+            ),
+        )
+
+        print(f"{'endpoint':<20} {'way':<14} {'ms':>8} {'speedup':>8}")
+        mismatches = 0
+        with app.app_context():
+            for endpoint, build in endpoints:
+                baseline = None
+                for way, query, provider in WAYS:
+                    elapsed, body = time_way(
+                        app, build, query, provider, args.repeat
+                    )
+                    if baseline is None:
+                        baseline, expected = elapsed, json.loads(body)
+                    elif json.loads(body) != expected:
+                        print(f"{endpoint}: {way} gives different json")
+                        mismatches += 1
+                    print(
+                        f"{endpoint:<20} {way:<14} {elapsed:>8.2f} "
+                        f"{baseline / elapsed:>7.2f}x"
+                    )
+
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""Checks menu snapshots stay consistent and compares serving them.
+
+A generated catalog starts without snapshots, so the menu items api serves
+every full menu from menu_items. The full menus of a sample of restaurants
+are requested repeatedly with the menu cache disabled, the snapshots are
+rebuilt and the same menus are requested again, and the requests/sec of
+each are reported. Every snapshot must give the same json as the menu items
+api's paginated responses, which are never snapshotted.
+
+Every kind of write to restaurants and menu items is then made through the
+app, and the consistency checker must find no snapshot out of step.
+
+Usage: python -m benchmarks.snapshots [--restaurants 200]
+    [--menu-items 200] [--requests 2000]
+
+Attributes:
+    WRITES: A tuple of the method, url and form or json body of the writes
+        made, covering every route changing a menu
+"""
+
+import argparse
+import random
+import sys
+import time
+
+from benchmarks.generate import temporary_database
+
+WRITES = (
+    ("POST", "/restaurants/new/", {"data": {"name": "New Restaurant"}}),
+    ("POST", "/restaurants/1/edit/", {"data": {"name": "Renamed"}}),
+    (
+        "POST",
+        "/restaurants/1/menu/new/",
+        {"data": {"name": "New Item", "course": "Dessert", "price": "$2"}},
+    ),
+    ("POST", "/restaurants/1/menu/1/edit/", {"data": {"price": "$3.50"}}),
+    (
+        "POST",
+        "/restaurants/1/menu/2/edit/",
+        {"data": {"restaurant_id": "2"}},
+    ),
+    ("POST", "/restaurants/1/menu/3/delete/", {}),
+    (
+        "POST",
+        "/api/restaurants/2/menu/batch/",
+        {
+            "json": {
+                "create": [{"name": "Batch Item", "price": "$4.00"}],
+                "update": [{"id": 2, "description": "Moved"}],
+            }
+        },
+    ),
+    ("PATCH", "/api/restaurants/2/", {"json": {"name": "Patched"}}),
+    (
+        "PATCH",
+        "/api/restaurants/1/menu/4/",
+        {"json": {"price": "$5.25", "course": "Entree"}},
+    ),
+    ("POST", "/restaurants/3/delete/", {}),
+)
+
+
+def time_menus(client, restaurant_ids, requests):
+    """Requests restaurants' full menus from the api.
+
+    Args:
+        client: A flask test client of the app
+        restaurant_ids: A list of ints representing the ids of the
+            restaurants whose menus to request
+        requests: An int representing the number of requests to make
+
+    Returns:
+        A float representing the number of requests answered per second
+    """
+    start = time.perf_counter()
+    for index in range(requests):
+        restaurant_id = restaurant_ids[index % len(restaurant_ids)]
+        client.get(f"/api/restaurants/{restaurant_id}/menu/")
+
+    return requests / (time.perf_counter() - start)
+
+
+def check_menus(client, restaurant_ids):
+    """Compares full menus with the same menus fetched as a single page.
+
+    Args:
+        client: A flask test client of the app
+        restaurant_ids: A list of ints representing the ids of the
+            restaurants whose menus to compare
+
+    Returns:
+        failures: A list of strs describing the menus that differ
+    """
+    failures = []
+    for restaurant_id in restaurant_ids:
+        url = f"/api/restaurants/{restaurant_id}/menu/"
+        full = client.get(url).get_json()
+        paged = client.get(f"{url}?limit=1000").get_json()
+        if full != paged:
+            failures.append(f"Restaurant {restaurant_id}'s menu differs")
+
+    return failures
+
+
+def main():
+    """Compares serving menus with and without snapshots, then checks them."""
+    parser = argparse.ArgumentParser(
+        description="Checks and benchmarks menu snapshots."
+    )
+    parser.add_argument("--restaurants", type=int, default=200)
+    parser.add_argument("--menu-items", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    with temporary_database(args.restaurants, args.menu_items):
+        from app import create_app
+        from config import Config
+        from database import session
+        from snapshots import check_snapshots, rebuild_snapshots
+
+        app = create_app(
+            type("BenchmarkConfig", (Config,), {"MENU_CACHE_SIZE": 0})
+        )
+        app.logger.disabled = True
+        client = app.test_client()
+        restaurant_ids = random.Random(0).sample(
+            range(1, args.restaurants + 1), min(args.restaurants, 50)
+        )
+
+        without = time_menus(client, restaurant_ids, args.requests)
+        with app.app_context():
+            start = time.perf_counter()
+            count = rebuild_snapshots(session)
+            session.commit()
+            print(
+                f"Rebuilt {count} snapshots in "
+                f"{time.perf_counter() - start:.2f}s"
+            )
+        with_snapshots = time_menus(client, restaurant_ids, args.requests)
+        print(f"{'menus':<16} {'requests/s':>10}")
+        print(f"{'from menu_items':<16} {without:>10.1f}")
+        print(f"{'from snapshots':<16} {with_snapshots:>10.1f}")
+
+        failures = check_menus(client, restaurant_ids)
+        for method, url, kwargs in WRITES:
+            response = client.open(url, method=method, **kwargs)
+            if response.status_code >= 400:
+                failures.append(f"{method} {url} {response.status_code}")
+        failures.extend(check_menus(client, [1, 2, args.restaurants + 1]))
+        with app.app_context():
+            failures.extend(check_snapshots(session))
+
+        app.extensions["engine"].dispose()
+        app.extensions["read_engine"].dispose()
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""Measures how long a fresh process takes to serve its first response.
+
+Each run starts a new python process against a generated temporary db,
+as a new worker would during a traffic spike. In-process runs time
+importing the app, creating it and answering a first request through
+flask's test client. Server runs time starting a server subprocess (the
+threaded WSGI server and uvicorn with the ASGI app) until the first
+request over http succeeds. The median and slowest of every phase over the
+runs are reported.
+
+Usage: python -m benchmarks.startup [--runs 10] [--servers wsgi asgi]
+
+Attributes:
+    PATH: A str representing the path requested first
+    IN_PROCESS: A str of the python code timing the in-process phases
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+from benchmarks.connections import free_port
+from benchmarks.generate import temporary_database
+
+PATH = "/restaurants/1/menu/"
+IN_PROCESS = f"""
+import json, time
+start = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+status = app.test_client().get({PATH!r}).status_code
+responded = time.perf_counter()
+print(json.dumps({{
+    "import": imported - start,
+    "create_app": created - imported,
+    "first response": responded - created,
+    "total": responded - start,
+    "status": status,
+}}))
+"""
+
+
+def time_in_process():
+    """Times the phases of starting the app in a new process.
+
+    Returns:
+        timings: A dict mapping each phase to the seconds it took, and the
+            status of the first response
+    """
+    output = subprocess.run(
+        [sys.executable, "-c", IN_PROCESS],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    timings = json.loads(output.splitlines()[-1])
+
+    return timings
+
+
+def time_server(server, timeout=30):
+    """Times starting a server until it answers its first request.
+
+    Args:
+        server: A str representing the server to start, wsgi or asgi
+        timeout: A float representing the number of seconds to wait
+
+    Returns:
+        A dict mapping the phase to the seconds it took, and the status of
+            the first response
+
+    Raises:
+        RuntimeError: If the server didn't respond in time
+    """
+    port = free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "benchmarks.connections",
+            "--serve",
+            server,
+            "--port",
+            str(port),
+        ]
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(
+                    f"http://127.0.0.1:{port}{PATH}", timeout=1
+                ) as response:
+                    status = response.status
+                break
+            except urllib.error.HTTPError as error:
+                status = error.code
+                break
+            except OSError:
+                time.sleep(0.005)
+        else:
+            raise RuntimeError(f"{server} server didn't respond in time")
+
+        return {"total": time.perf_counter() - start, "status": status}
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def report(name, runs):
+    """Prints the median and slowest time of each phase of some runs.
+
+    Args:
+        name: A str naming what was started
+        runs: A list of dicts as returned by time_in_process or time_server
+    """
+    for phase in runs[0]:
+        if phase == "status":
+            continue
+        times = [run[phase] * 1000 for run in runs]
+        print(
+            f"{name:<12} {phase:<16} {statistics.median(times):>9.1f} "
+            f"{max(times):>9.1f}"
+        )
+
+    statuses = {run["status"] for run in runs}
+    if statuses != {200}:
+        print(f"{name:<12} responded with {sorted(statuses)}")
+
+
+def main():
+    """Starts the app repeatedly against a temporary db and prints timings."""
+    parser = argparse.ArgumentParser(
+        description="Measures the app's time to first response."
+    )
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--servers", nargs="*", default=["wsgi", "asgi"])
+    parser.add_argument("--restaurants", type=int, default=100)
+    parser.add_argument("--menu-items", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'started':<12} {'phase':<16} {'p50 ms':>9} {'max ms':>9}")
+    with temporary_database(args.restaurants, args.menu_items):
+        # The subprocesses inherit the temporary db's DATABASE_URI
+        os.environ.setdefault("MENU_CACHE_SIZE", "0")
+        report("in-process", [time_in_process() for _ in range(args.runs)])
+        for server in args.servers:
+            report(server, [time_server(server) for _ in range(args.runs)])
+
+
+if __name__ == "__main__":
+    main()
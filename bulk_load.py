@@ -0,0 +1,203 @@
+"""Bulk loads restaurants and their menus into the db from files.
+
+Rows are inserted with executemany in large transactions instead of one
+commit per row, and the load rate is reported when done. Pending migrations
+are applied first so the db can be empty.
+
+Two input formats are supported, chosen by file extension:
+
+    .jsonl: one restaurant per line as an object with a name and a list of
+        menu_items, each with a name, course, description and price
+    .csv: one menu item per line with the columns restaurant, name, course,
+        description and price; consecutive rows with the same restaurant
+        belong to the same restaurant and a row with only a restaurant
+        creates a restaurant without menu items
+
+Usage: bulk_load.py [--batch-size 10000] [--database-uri URI] file [file ...]
+
+Attributes:
+    MENU_ITEM_FIELDS: A tuple of the menu item fields read from input files
+"""
+
+import argparse
+import csv
+import json
+import os
+import time
+from itertools import groupby
+
+from sqlalchemy import create_engine, func, select
+
+import migrations
+from config import Config
+from models import MenuItem, Restaurant, parse_price
+
+MENU_ITEM_FIELDS = ("name", "course", "description", "price")
+
+
+def read_jsonl(path):
+    """Reads restaurants from a jsonl file.
+
+    Args:
+        path: A str representing the path of the file to read
+
+    Yields:
+        A tuple of the name of a restaurant and a list of dicts representing
+            its menu items
+    """
+    with open(path, encoding="utf-8") as jsonl_file:
+        for line in jsonl_file:
+            if line.strip():
+                restaurant = json.loads(line)
+                yield restaurant["name"], restaurant.get("menu_items", [])
+
+
+def read_csv(path):
+    """Reads restaurants from a csv file with one menu item per row.
+
+    Args:
+        path: A str representing the path of the file to read
+
+    Yields:
+        A tuple of the name of a restaurant and a list of dicts representing
+            its menu items
+    """
+    with open(path, encoding="utf-8", newline="") as csv_file:
+        rows = csv.DictReader(csv_file)
+        for name, group in groupby(rows, lambda row: row["restaurant"]):
+            menu_items = [
+                {field: row.get(field) or None for field in MENU_ITEM_FIELDS}
+                for row in group
+                if row.get("name")
+            ]
+            yield name, menu_items
+
+
+def read(path):
+    """Reads restaurants from a file in the format given by its extension.
+
+    Args:
+        path: A str representing the path of a .jsonl or .csv file
+
+    Returns:
+        An iterator of tuples of the name of a restaurant and a list of dicts
+            representing its menu items
+
+    Raises:
+        ValueError: If the file isn't a .jsonl or .csv file
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".jsonl":
+        return read_jsonl(path)
+    if extension == ".csv":
+        return read_csv(path)
+
+    raise ValueError(f"Unsupported file type: {path}")
+
+
+def batches(restaurants, batch_size):
+    """Groups restaurants into batches of roughly batch_size rows each.
+
+    Args:
+        restaurants: An iterable of tuples of a restaurant name and its menu
+            items
+        batch_size: An int representing the number of rows per batch
+
+    Yields:
+        A list of tuples of a restaurant name and its menu items
+    """
+    batch = []
+    rows = 0
+    for restaurant in restaurants:
+        batch.append(restaurant)
+        rows += 1 + len(restaurant[1])
+        if rows >= batch_size:
+            yield batch
+            batch = []
+            rows = 0
+
+    if batch:
+        yield batch
+
+
+def load(engine, restaurants, batch_size=10000):
+    """Inserts restaurants and their menu items in batched transactions.
+
+    Restaurant ids are assigned up front from the current maximum id so menu
+    items can reference them without a round trip per restaurant.
+
+    Args:
+        engine: A sqlalchemy Engine with a connection to the db
+        restaurants: An iterable of tuples of a restaurant name and a list of
+            dicts representing its menu items
+        batch_size: An int representing the number of rows per transaction
+
+    Returns:
+        A tuple of the number of restaurants and menu items inserted
+    """
+    restaurant_count = 0
+    menu_item_count = 0
+
+    for batch in batches(restaurants, batch_size):
+        with engine.begin() as connection:
+            max_id = connection.execute(
+                select([func.max(Restaurant.id)])
+            ).scalar()
+            next_id = (max_id or 0) + 1
+
+            restaurant_rows = []
+            menu_item_rows = []
+            for restaurant_id, (name, menu_items) in enumerate(
+                batch, start=next_id
+            ):
+                restaurant_rows.append({"id": restaurant_id, "name": name})
+                for menu_item in menu_items:
+                    row = {
+                        field: menu_item.get(field)
+                        for field in MENU_ITEM_FIELDS
+                    }
+                    row["price_cents"] = parse_price(row.pop("price"))
+                    row["restaurant_id"] = restaurant_id
+                    menu_item_rows.append(row)
+
+            connection.execute(Restaurant.__table__.insert(), restaurant_rows)
+            if menu_item_rows:
+                connection.execute(MenuItem.__table__.insert(), menu_item_rows)
+
+        restaurant_count += len(restaurant_rows)
+        menu_item_count += len(menu_item_rows)
+
+    return restaurant_count, menu_item_count
+
+
+def main():
+    """Loads the files given on the command line and reports the rate."""
+    parser = argparse.ArgumentParser(
+        description="Bulk loads restaurants and menus into the db."
+    )
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--database-uri", default=Config.DATABASE_URI)
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_uri)
+    migrations.upgrade(engine)
+
+    start = time.perf_counter()
+    restaurant_count = 0
+    menu_item_count = 0
+    for path in args.files:
+        restaurants, menu_items = load(engine, read(path), args.batch_size)
+        restaurant_count += restaurants
+        menu_item_count += menu_items
+    elapsed = time.perf_counter() - start
+
+    rows = restaurant_count + menu_item_count
+    print(
+        f"Loaded {restaurant_count} restaurants and {menu_item_count} menu "
+        f"items in {elapsed:.2f}s ({rows / elapsed:.0f} rows/sec)"
+    )
+
+
+if __name__ == "__main__":
+    main()
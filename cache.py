@@ -0,0 +1,201 @@
+"""An in-process cache for menus that are read far more often than written.
+
+Classes:
+    MenuCache()
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class MenuCache:
+    """A thread-safe LRU cache of menus keyed by restaurant id, with a TTL.
+
+    Each restaurant's entry holds any number of representations of its menu
+    (e.g. the serialized json or the rendered page) under their own keys, so
+    a change to the menu invalidates all of them at once. The number of
+    cached restaurants is bounded by max_size, evicting the least recently
+    used one, and the number of keys of each restaurant by max_keys, evicting
+    its least recently used key, so clients paging or filtering through a
+    menu can't grow the cache without bound. Every entry expires ttl seconds
+    after it was created.
+
+    A value computed from the db is only stored if no invalidation happened
+    in the meantime, so a read racing with a write can't put the stale menu
+    back into the cache. Every value is also stored with the version of the
+    data it was computed from, and is only returned for that version: a
+    process can't serve a menu changed by another process (which only
+    invalidates its own cache) under the menu's new ETag.
+
+    Attributes:
+        max_size: An int representing the number of restaurants to cache
+        ttl: A float representing the number of seconds an entry is valid for
+        max_keys: An int representing the number of keys cached for each
+            restaurant
+        hits: An int representing the number of lookups served from the cache
+        misses: An int representing the number of lookups not in the cache
+        evictions: An int representing the number of entries (or keys of an
+            entry) removed to make room for others
+        generation: An int incremented every time an entry is invalidated
+    """
+
+    def __init__(self, max_size, ttl, max_keys=32):
+        """Creates an empty cache.
+
+        Args:
+            max_size: An int representing the number of restaurants to cache
+            ttl: A float representing the number of seconds an entry is valid
+            max_keys: An int representing the number of keys cached for each
+                restaurant
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _entry(self, restaurant_id):
+        """Retrieves the live entry for a restaurant, dropping it if expired.
+
+        Must be called with the lock held.
+
+        Args:
+            restaurant_id: An int representing the id of the restaurant
+
+        Returns:
+            values: The dict of cached values for the restaurant, or None
+        """
+        entry = self._entries.get(restaurant_id)
+        if entry is None:
+            return None
+
+        expires_at, values = entry
+        if expires_at <= time.monotonic():
+            del self._entries[restaurant_id]
+            return None
+
+        self._entries.move_to_end(restaurant_id)
+        return values
+
+    def get(self, restaurant_id, key, version=None):
+        """Retrieves a cached value for a restaurant.
+
+        Args:
+            restaurant_id: An int representing the id of the restaurant
+            key: A hashable identifying the representation of the menu
+            version: A str identifying the current version of the data the
+                value is computed from
+
+        Returns:
+            value: The cached value, or None if it isn't cached for the
+                version
+        """
+        with self._lock:
+            values = self._entry(restaurant_id)
+            cached = None if values is None else values.get(key)
+            value = None
+            if cached is not None and cached[0] == version:
+                value = cached[1]
+
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                values.move_to_end(key)
+
+        return value
+
+    def set(  # pylint: disable=too-many-arguments
+        self, restaurant_id, key, value, generation, version=None
+    ):
+        """Caches a value for a restaurant.
+
+        Args:
+            restaurant_id: An int representing the id of the restaurant
+            key: A hashable identifying the representation of the menu
+            value: The value to cache
+            generation: The cache's generation read before the value was
+                computed, the value is discarded if it has changed since
+            version: A str identifying the version of the data the value was
+                computed from
+        """
+        with self._lock:
+            if generation != self.generation:
+                return
+
+            values = self._entry(restaurant_id)
+            if values is None:
+                values = OrderedDict()
+                self._entries[restaurant_id] = (
+                    time.monotonic() + self.ttl,
+                    values,
+                )
+            values[key] = (version, value)
+            values.move_to_end(key)
+
+            while len(values) > self.max_keys:
+                values.popitem(last=False)
+                self.evictions += 1
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_set(self, restaurant_id, key, compute, version=None):
+        """Retrieves a cached value, computing and caching it on a miss.
+
+        Args:
+            restaurant_id: An int representing the id of the restaurant
+            key: A hashable identifying the representation of the menu
+            compute: A function taking no arguments that returns the value
+            version: A str identifying the current version of the data the
+                value is computed from
+
+        Returns:
+            value: The cached or newly computed value
+        """
+        generation = self.generation
+        value = self.get(restaurant_id, key, version)
+        if value is None:
+            value = compute()
+            self.set(restaurant_id, key, value, generation, version)
+
+        return value
+
+    def invalidate(self, restaurant_id):
+        """Removes everything cached for a restaurant.
+
+        Args:
+            restaurant_id: An int representing the id of the restaurant
+        """
+        with self._lock:
+            self.generation += 1
+            self._entries.pop(restaurant_id, None)
+
+    @property
+    def stats(self):
+        """Summarizes the cache's size and counters as a dict.
+
+        Returns:
+            stats: A dict of the cache's size, limits and counters
+        """
+        with self._lock:
+            stats = {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "keys": sum(
+                    len(values) for _, values in self._entries.values()
+                ),
+                "max_keys": self.max_keys,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+        return stats
@@ -0,0 +1,276 @@
+"""Compression of responses negotiated with the client's Accept-Encoding.
+
+Text responses (html, json, css...) of at least COMPRESSION_MIN_SIZE bytes
+are compressed with brotli (if installed) or gzip, whichever the client
+prefers. Responses served from the menu cache keep their compressed bodies
+in the same cache entry, so popular menus are compressed once rather than on
+every request, and are invalidated with the menu. Static files are served
+from .br and .gz copies made ahead of time by running this module, which
+compresses them as much as possible since it's only done once.
+
+Usage: python compression.py [static_folder]
+
+Attributes:
+    ENCODINGS: A dict mapping each supported content coding, in order of
+        preference, to the suffix of the precompressed copies of files
+    COMPRESSIBLE_MIMETYPES: A frozenset of the mimetypes worth compressing
+
+Functions:
+    available_encodings()
+    negotiate()
+    compress()
+    cache_compressed()
+    compressed_body()
+    compress_response()
+    send_static_file()
+    compress_responses()
+    precompress()
+    main()
+"""
+
+import gzip
+import mimetypes
+import os
+import sys
+
+from flask import current_app, g, request, send_from_directory
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+COMPRESSIBLE_MIMETYPES = frozenset(
+    (
+        "application/javascript",
+        "application/json",
+        "image/svg+xml",
+        "text/css",
+        "text/html",
+        "text/plain",
+    )
+)
+
+
+def available_encodings():
+    """Lists the content codings that can be produced, in order of preference.
+
+    Returns:
+        A list of strs of the content codings
+    """
+    return [
+        encoding
+        for encoding in ENCODINGS
+        if encoding != "br" or brotli is not None
+    ]
+
+
+def negotiate():
+    """Picks the content coding to send from the request's Accept-Encoding.
+
+    Returns:
+        A str of the content coding the client prefers among those available,
+            or None to send the response uncompressed
+    """
+    return request.accept_encodings.best_match(available_encodings())
+
+
+def compress(data, encoding, best=False):
+    """Compresses a body with a content coding.
+
+    Args:
+        data: The bytes to compress
+        encoding: A str of the content coding, br or gzip
+        best: A bool indicating whether to compress as much as possible,
+            rather than at a level fast enough for every request
+
+    Returns:
+        The compressed bytes
+    """
+    if encoding == "br":
+        return brotli.compress(data, quality=11 if best else 5)
+
+    return gzip.compress(data, compresslevel=9 if best else 6, mtime=0)
+
+
+def cache_compressed(restaurant_id, key, generation, version=None):
+    """Caches the compressed bodies of the response alongside its own body.
+
+    Called by views whose response body is cached in the menu cache, so its
+    compressed bodies are stored in the same restaurant's entry, for the
+    same version.
+
+    Args:
+        restaurant_id: An int representing the id of the restaurant
+        key: A hashable identifying the cached body in the menu cache
+        generation: The cache's generation read before the body was
+            computed, as passed to MenuCache.set
+        version: A str identifying the version of the data the body is
+            computed from, as passed to MenuCache.set
+    """
+    g.compression_cache_entry = (restaurant_id, key, generation, version)
+
+
+def compressed_body(data, encoding):
+    """Compresses a response's body, reusing the menu cache's copy if any.
+
+    Args:
+        data: The bytes of the response's body
+        encoding: A str of the content coding
+
+    Returns:
+        compressed: The compressed bytes
+    """
+    entry = g.get("compression_cache_entry")
+    if entry is None:
+        return compress(data, encoding)
+
+    restaurant_id, key, generation, version = entry
+    menu_cache = current_app.extensions["menu_cache"]
+    compressed = menu_cache.get(restaurant_id, (key, encoding), version)
+    if compressed is None:
+        compressed = compress(data, encoding)
+        menu_cache.set(
+            restaurant_id, (key, encoding), compressed, generation, version
+        )
+
+    return compressed
+
+
+def compress_response(response):
+    """Compresses a response if it's worth it and the client accepts it.
+
+    The response's ETag is made weak, as the compressed bytes differ from
+    the uncompressed ones the ETag was derived from.
+
+    Args:
+        response: The flask Response being sent
+
+    Returns:
+        response: The same response, compressed if possible
+    """
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+
+    response.vary.add("Accept-Encoding")
+    if (
+        response.status_code != 200
+        or response.direct_passthrough
+        or response.is_streamed
+        or "Content-Encoding" in response.headers
+    ):
+        return response
+
+    data = response.get_data()
+    encoding = negotiate()
+    if len(data) < current_app.config["COMPRESSION_MIN_SIZE"] or not encoding:
+        return response
+
+    response.set_data(compressed_body(data, encoding))
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+    return response
+
+
+def send_static_file(filename):
+    """Serves a static file, from its precompressed copy if there is one.
+
+    Copies older than the file itself are ignored, so a changed file is
+    served uncompressed until it is precompressed again.
+
+    Args:
+        filename: A str representing the path of the file in the static folder
+
+    Returns:
+        response: A flask Response sending the file
+    """
+    static_folder = current_app.static_folder
+    encoding = negotiate()
+    path = safe_join(static_folder, filename)
+    if encoding and path and os.path.isfile(path):
+        suffix = ENCODINGS[encoding]
+        if os.path.isfile(path + suffix) and os.path.getmtime(
+            path + suffix
+        ) >= os.path.getmtime(path):
+            response = send_from_directory(
+                static_folder,
+                filename + suffix,
+                mimetype=mimetypes.guess_type(filename)[0],
+                max_age=current_app.get_send_file_max_age(filename),
+            )
+            response.headers["Content-Encoding"] = encoding
+            return response
+
+    return current_app.send_static_file(filename)
+
+
+def compress_responses(app):
+    """Compresses an app's responses and serves its precompressed files.
+
+    Args:
+        app: The flask app whose responses to compress
+    """
+    app.after_request(compress_response)
+    if "static" in app.view_functions:
+        app.view_functions["static"] = send_static_file
+
+
+def precompress(static_folder):
+    """Writes compressed copies of the compressible files in a folder.
+
+    A copy is only written if it's missing or older than the file, and only
+    kept if it's smaller than the file.
+
+    Args:
+        static_folder: A str representing the path of the folder
+
+    Returns:
+        written: A list of strs representing the paths of the copies written
+    """
+    written = []
+    for directory, _, filenames in os.walk(static_folder):
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            mimetype = mimetypes.guess_type(filename)[0]
+            if mimetype not in COMPRESSIBLE_MIMETYPES:
+                continue
+
+            with open(path, "rb") as file:
+                data = file.read()
+            for encoding in available_encodings():
+                copy = path + ENCODINGS[encoding]
+                if os.path.isfile(copy) and os.path.getmtime(
+                    copy
+                ) >= os.path.getmtime(path):
+                    continue
+
+                compressed = compress(data, encoding, best=True)
+                if len(compressed) < len(data):
+                    with open(copy, "wb") as file:
+                        file.write(compressed)
+                    written.append(copy)
+
+    return written
+
+
+def main():
+    """Precompresses the static folder given on the command line."""
+    static_folder = (
+        sys.argv[1]
+        if len(sys.argv) > 1
+        else os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+    )
+    if brotli is None:
+        print("brotli isn't installed, only writing gzip copies")
+
+    for copy in precompress(static_folder):
+        print(f"Wrote {copy}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Configuration values for the restaurant menu app.
+
+Scalar values can be overridden with an environment variable of the same name.
+
+Classes:
+    Config()
+    ProductionConfig()
+    TestingConfig()
+
+Attributes:
+    CONFIGS: A dict mapping the name of each environment, as given by the
+        APP_CONFIG environment variable, to its configuration
+"""
+
+import os
+
+
+class Config:
+    """Default configuration for the app.
+
+    Attributes:
+        SECRET_KEY: A str used by flask to sign the session cookie
+        DATABASE_URI: A str representing the sqlalchemy url of the db
+        READ_DATABASE_URI: A str representing the sqlalchemy url of the db
+            GET requests read from, such as a replica synced by flask
+            sync-replica, by default DATABASE_URI opened read-only
+        ASYNC_DATABASE_URI: A str representing the sqlalchemy url of the db
+            for the async serving mode, by default the read db with the
+            aiosqlite driver
+        DB_POOL_SIZE: An int representing the number of connections kept open
+            in the connection pool
+        DB_MAX_OVERFLOW: An int representing the number of connections that
+            may be opened beyond DB_POOL_SIZE under load
+        DB_POOL_RECYCLE: An int representing the number of seconds after which
+            a pooled connection is replaced (-1 to never recycle)
+        DB_POOL_TIMEOUT: An int representing the number of seconds to wait for
+            a connection from the pool before giving up
+        MENU_COURSES: A dict mapping each course, in the order it appears on
+            the menu, to the heading it is displayed under
+        API_PAGE_SIZE: An int representing the number of rows returned per
+            page by the api when a cursor is given without a limit
+        API_MAX_PAGE_SIZE: An int representing the largest limit a client may
+            request from the api
+        API_MAX_BATCH_SIZE: An int representing the most restaurants whose
+            menus may be requested at once from the batch menu api
+        EXPORT_BATCH_SIZE: An int representing the number of rows fetched
+            from the db at a time while streaming the catalog export
+        MENU_CACHE_SIZE: An int representing the number of restaurants whose
+            menus are kept in the in-process cache
+        MENU_CACHE_TTL: A float representing the number of seconds a cached
+            menu is served before it is reloaded from the db
+        MENU_CACHE_MAX_KEYS: An int representing the number of
+            representations (pages, filters, encodings) of each restaurant's
+            menu kept in the cache
+        SEARCH_RESULTS_LIMIT: An int representing the number of results
+            returned by the search api when no limit is given
+        COMPRESSION_MIN_SIZE: An int representing the number of bytes below
+            which responses are sent uncompressed
+        QUERY_BUDGET_MODE: A str representing what happens when a request
+            runs more sql queries than its route's budget: log a warning,
+            raise an error or turn the check off
+        SQLITE_JOURNAL_MODE: A str representing the journal mode of sqlite
+            dbs, wal lets readers proceed while a write is in progress
+        SQLITE_SYNCHRONOUS: A str representing how often sqlite syncs to
+            disk, normal only syncs at wal checkpoints rather than on every
+            commit
+        SQLITE_CACHE_SIZE: An int representing the page cache of each
+            connection, in pages if positive or in KiB if negative
+        SQLITE_MMAP_SIZE: An int representing the number of bytes of the db
+            read through memory mapped i/o
+        SQLITE_BUSY_TIMEOUT: An int representing the number of milliseconds
+            to wait for a lock held by another connection
+        SQLITE_TEMP_STORE: A str representing where temporary tables and
+            indexes (e.g. for sorting) are kept
+    """
+
+    SECRET_KEY = os.environ.get("SECRET_KEY", "super_secret_key")
+    DATABASE_URI = os.environ.get(
+        "DATABASE_URI", "sqlite:///restaurant_menu.db"
+    )
+    READ_DATABASE_URI = os.environ.get("READ_DATABASE_URI")
+    ASYNC_DATABASE_URI = os.environ.get("ASYNC_DATABASE_URI")
+    DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+    DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+    DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 3600))
+    DB_POOL_TIMEOUT = int(os.environ.get("DB_POOL_TIMEOUT", 30))
+    API_PAGE_SIZE = int(os.environ.get("API_PAGE_SIZE", 100))
+    API_MAX_PAGE_SIZE = int(os.environ.get("API_MAX_PAGE_SIZE", 1000))
+    API_MAX_BATCH_SIZE = int(os.environ.get("API_MAX_BATCH_SIZE", 200))
+    EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", 1000))
+    MENU_CACHE_SIZE = int(os.environ.get("MENU_CACHE_SIZE", 1024))
+    MENU_CACHE_TTL = float(os.environ.get("MENU_CACHE_TTL", 300))
+    MENU_CACHE_MAX_KEYS = int(os.environ.get("MENU_CACHE_MAX_KEYS", 32))
+    SEARCH_RESULTS_LIMIT = int(os.environ.get("SEARCH_RESULTS_LIMIT", 20))
+    COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", 500))
+    QUERY_BUDGET_MODE = os.environ.get("QUERY_BUDGET_MODE", "log")
+    SQLITE_JOURNAL_MODE = os.environ.get("SQLITE_JOURNAL_MODE", "wal")
+    SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "normal")
+    SQLITE_CACHE_SIZE = int(os.environ.get("SQLITE_CACHE_SIZE", -16000))
+    SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", 0))
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get("SQLITE_BUSY_TIMEOUT", 5000))
+    SQLITE_TEMP_STORE = os.environ.get("SQLITE_TEMP_STORE", "memory")
+    MENU_COURSES = {
+        "Appetizer": "Appetizers",
+        "Entree": "Entrees",
+        "Dessert": "Desserts",
+        "Beverage": "Beverages",
+    }
+
+
+class ProductionConfig(Config):
+    """Configuration for serving the app, with larger sqlite caches."""
+
+    QUERY_BUDGET_MODE = os.environ.get("QUERY_BUDGET_MODE", "off")
+    SQLITE_CACHE_SIZE = int(os.environ.get("SQLITE_CACHE_SIZE", -64000))
+    SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", 268435456))
+
+
+class TestingConfig(Config):
+    """Configuration for throwaway dbs, trading durability for speed."""
+
+    TESTING = True
+    QUERY_BUDGET_MODE = os.environ.get("QUERY_BUDGET_MODE", "raise")
+    SQLITE_JOURNAL_MODE = os.environ.get("SQLITE_JOURNAL_MODE", "memory")
+    SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "off")
+
+
+CONFIGS = {
+    "default": Config,
+    "production": ProductionConfig,
+    "testing": TestingConfig,
+}
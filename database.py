@@ -0,0 +1,257 @@
+"""Connections to the db shared by the app's requests.
+
+Reads and writes can go to separate engines: GET requests read from the
+read engine, a read-only connection to the same sqlite file (or a replica of
+it, see replica.py), so they never wait on the writer, while every other
+request and any write goes to the writer engine.
+
+Attributes:
+    SQLITE_PRAGMAS: A dict mapping each sqlite pragma set on new connections
+        to the config setting holding its value
+    WRITER_PRAGMAS: A tuple of the pragmas only set on connections that write
+    READ_METHODS: A frozenset of the http methods whose requests read from the
+        read engine
+    session: A sqlalchemy scoped_session giving each thread its own session,
+        bound to the read or writer engine of the current app
+
+Classes:
+    AppSession()
+
+Functions:
+    sqlite_pragmas()
+    set_pragmas_on_connect()
+    read_database_uri()
+    create_engine()
+    create_read_engine()
+    create_async_engine()
+"""
+
+from urllib.parse import quote
+
+import sqlalchemy
+from flask import current_app, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session, scoped_session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from sqlalchemy.sql.dml import UpdateBase
+
+SQLITE_PRAGMAS = {
+    "busy_timeout": "SQLITE_BUSY_TIMEOUT",
+    "journal_mode": "SQLITE_JOURNAL_MODE",
+    "synchronous": "SQLITE_SYNCHRONOUS",
+    "cache_size": "SQLITE_CACHE_SIZE",
+    "mmap_size": "SQLITE_MMAP_SIZE",
+    "temp_store": "SQLITE_TEMP_STORE",
+}
+WRITER_PRAGMAS = ("journal_mode", "synchronous")
+READ_METHODS = frozenset(("GET", "HEAD", "OPTIONS"))
+
+
+class AppSession(Session):
+    """A session using the engines of the app handling the current request."""
+
+    def get_bind(
+        self, mapper=None, clause=None, **kwargs
+    ):  # pylint: disable=unused-argument
+        """Picks the engine to run a query on.
+
+        Queries of GET requests run on the read engine, unless they write.
+        Everything else, including commands run outside of a request, runs
+        on the writer engine so it reads its own writes.
+
+        Args:
+            mapper: The mapper of the entity queried, if any (unused)
+            clause: The sql expression being executed, if any
+            kwargs: Any other arguments passed by sqlalchemy (unused)
+
+        Returns:
+            engine: The sqlalchemy Engine created for the current app
+        """
+        extensions = current_app.extensions
+        if (
+            self._flushing
+            or isinstance(clause, UpdateBase)
+            or not has_request_context()
+            or request.method not in READ_METHODS
+        ):
+            return extensions["engine"]
+
+        engine = extensions["read_engine"]
+        return engine
+
+
+session = scoped_session(sessionmaker(class_=AppSession))
+
+
+def sqlite_pragmas(config, read_only=False):
+    """Collects the sqlite pragmas to set from a config.
+
+    Args:
+        config: A dict-like mapping config settings to their values
+        read_only: A bool indicating whether the connections only read, so
+            the pragmas for writing are left out and writes are refused
+
+    Returns:
+        pragmas: A dict mapping each pragma to its value, leaving out those
+            set to None or "" so sqlite's default is kept
+    """
+    pragmas = {}
+    for pragma, setting in SQLITE_PRAGMAS.items():
+        value = config.get(setting)
+        if read_only and pragma in WRITER_PRAGMAS:
+            continue
+        if value is not None and value != "":
+            pragmas[pragma] = value
+
+    if read_only:
+        pragmas["query_only"] = 1
+
+    return pragmas
+
+
+def set_pragmas_on_connect(engine, config, read_only=False):
+    """Applies the sqlite pragmas from a config to every new connection.
+
+    The busy timeout is set first so the others wait for locks held by other
+    connections rather than failing.
+
+    Args:
+        engine: A sqlalchemy Engine with a connection to a sqlite db
+        config: A dict-like mapping config settings to their values
+        read_only: A bool indicating whether the engine only reads
+    """
+    pragmas = sqlite_pragmas(config, read_only)
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(
+        dbapi_connection, connection_record
+    ):  # pylint: disable=unused-argument
+        """Sets the pragmas on a newly opened connection.
+
+        Args:
+            dbapi_connection: The dbapi connection just opened
+            connection_record: The pool's record of the connection (unused)
+        """
+        cursor = dbapi_connection.cursor()
+        for pragma, value in pragmas.items():
+            cursor.execute(f"PRAGMA {pragma} = {value}")
+        cursor.close()
+
+
+def read_database_uri(config):
+    """Finds the url of the db to read from.
+
+    Args:
+        config: A dict-like mapping config settings to their values
+
+    Returns:
+        A str of READ_DATABASE_URI if set, else of DATABASE_URI opened
+            read-only if it's a sqlite file, or None to read from the writer
+    """
+    if config["READ_DATABASE_URI"]:
+        return config["READ_DATABASE_URI"]
+
+    url = make_url(config["DATABASE_URI"])
+    if (
+        url.get_backend_name() != "sqlite"
+        or url.database in (None, "", ":memory:")
+        or url.query.get("uri")
+    ):
+        return None
+
+    return str(
+        url.set(
+            database=f"file:{quote(url.database)}",
+            query={"mode": "ro", "uri": "true"},
+        )
+    )
+
+
+def create_engine(config, database_uri=None, read_only=False):
+    """Creates an engine for the db with a connection pool.
+
+    Sqlite connections have the pragmas from the config applied as soon as
+    they are opened, as most of them only last for the connection.
+
+    Args:
+        config: A dict-like mapping config settings to their values
+        database_uri: A str representing the url of the db, by default
+            DATABASE_URI
+        read_only: A bool indicating whether the engine only reads
+
+    Returns:
+        engine: A sqlalchemy Engine with a connection to the db
+    """
+    database_uri = database_uri or config["DATABASE_URI"]
+    is_sqlite = database_uri.startswith("sqlite")
+    engine = sqlalchemy.create_engine(
+        database_uri,
+        poolclass=QueuePool,
+        pool_size=config["DB_POOL_SIZE"],
+        max_overflow=config["DB_MAX_OVERFLOW"],
+        pool_recycle=config["DB_POOL_RECYCLE"],
+        pool_timeout=config["DB_POOL_TIMEOUT"],
+        connect_args={"check_same_thread": False} if is_sqlite else {},
+    )
+
+    if is_sqlite:
+        set_pragmas_on_connect(engine, config, read_only)
+
+    return engine
+
+
+def create_read_engine(config):
+    """Creates the engine GET requests read from, see read_database_uri.
+
+    Args:
+        config: A dict-like mapping config settings to their values
+
+    Returns:
+        A sqlalchemy Engine only reading from the db, or None to read from
+            the writer engine
+    """
+    database_uri = read_database_uri(config)
+    if database_uri is None:
+        return None
+
+    return create_engine(config, database_uri, read_only=True)
+
+
+def create_async_engine(config):
+    """Creates an asyncio engine for the db with a connection pool.
+
+    The engine only serves reads, so it connects to the read db by default.
+    Sqlite urls are switched to the aiosqlite driver, other dbs need an
+    ASYNC_DATABASE_URI naming an async driver.
+
+    Args:
+        config: A dict-like mapping config settings to their values
+
+    Returns:
+        engine: A sqlalchemy AsyncEngine with a connection to the db
+    """
+    # Only the ASGI app needs asyncio support, which is slow to import
+    from sqlalchemy.ext import asyncio
+
+    url = make_url(
+        config["ASYNC_DATABASE_URI"]
+        or read_database_uri(config)
+        or config["DATABASE_URI"]
+    )
+    if url.drivername == "sqlite":
+        url = url.set(drivername="sqlite+aiosqlite")
+
+    engine = asyncio.create_async_engine(
+        url,
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=config["DB_POOL_SIZE"],
+        max_overflow=config["DB_MAX_OVERFLOW"],
+        pool_recycle=config["DB_POOL_RECYCLE"],
+        pool_timeout=config["DB_POOL_TIMEOUT"],
+    )
+
+    if url.get_backend_name() == "sqlite":
+        set_pragmas_on_connect(engine.sync_engine, config, read_only=True)
+
+    return engine
@@ -0,0 +1,164 @@
+"""Content-hash fingerprints for the urls of static files.
+
+The static folder is hashed once when the app is created, and url_for adds
+each file's hash to its url as a v query param (e.g.
+/static/styles.css?v=3f2a9c1b7d4e). A request for a file with its current
+hash can be cached by browsers forever, as a change to the file changes its
+url, so repeat page views make no requests for static files. Requests
+without the hash, or with an outdated one, are revalidated as before.
+Files changed while the app is running keep their old hash until it is
+restarted.
+
+The static files and templates together are also hashed into a build
+fingerprint, which pages add to their ETags so a deploy changing how they
+render (or which stylesheet they link to) isn't answered with a 304.
+
+Attributes:
+    IMMUTABLE_MAX_AGE: An int representing the number of seconds
+        fingerprinted files are cached for, a year
+
+Functions:
+    hash_file()
+    fingerprint_files()
+    add_fingerprint()
+    cache_fingerprinted()
+    fingerprint_static_files()
+    fingerprint_build()
+"""
+
+import hashlib
+import os
+from datetime import datetime
+
+from flask import current_app, request
+
+from compression import ENCODINGS
+
+IMMUTABLE_MAX_AGE = 31536000
+
+
+def hash_file(path):
+    """Hashes the contents of a file.
+
+    Args:
+        path: A str representing the path of the file
+
+    Returns:
+        A str of the first 12 hex digits of the file's sha256
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(65536), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()[:12]
+
+
+def fingerprint_files(static_folder):
+    """Hashes every file in a folder, except precompressed copies.
+
+    Args:
+        static_folder: A str representing the path of the folder
+
+    Returns:
+        fingerprints: A dict mapping the path of each file, relative to the
+            folder and with forward slashes as in urls, to its hash
+    """
+    fingerprints = {}
+    for directory, _, filenames in os.walk(static_folder):
+        for filename in filenames:
+            if filename.endswith(tuple(ENCODINGS.values())):
+                continue
+            path = os.path.join(directory, filename)
+            name = os.path.relpath(path, static_folder).replace(os.sep, "/")
+            fingerprints[name] = hash_file(path)
+
+    return fingerprints
+
+
+def add_fingerprint(endpoint, values):
+    """Adds a static file's hash to the url built for it by url_for.
+
+    Args:
+        endpoint: A str representing the endpoint the url is built for
+        values: A dict of the url's arguments, updated in place
+    """
+    if endpoint != "static" or "v" in values:
+        return
+
+    fingerprint = current_app.extensions["static_fingerprints"].get(
+        values.get("filename")
+    )
+    if fingerprint is not None:
+        values["v"] = fingerprint
+
+
+def cache_fingerprinted(response):
+    """Lets browsers cache a static file requested with its current hash.
+
+    Args:
+        response: The flask Response being sent
+
+    Returns:
+        response: The same response, with a long-lived Cache-Control if it
+            is for a fingerprinted url
+    """
+    if request.endpoint != "static" or response.status_code not in (200, 304):
+        return response
+
+    fingerprint = current_app.extensions["static_fingerprints"].get(
+        request.view_args.get("filename")
+    )
+    if fingerprint is not None and request.args.get("v") == fingerprint:
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+
+    return response
+
+
+def fingerprint_static_files(app):
+    """Hashes an app's static files and fingerprints the urls built for them.
+
+    Args:
+        app: The flask app whose static files to fingerprint
+    """
+    if not app.has_static_folder:
+        return
+
+    app.extensions["static_fingerprints"] = fingerprint_files(
+        app.static_folder
+    )
+    app.url_defaults(add_fingerprint)
+    app.after_request(cache_fingerprinted)
+
+
+def fingerprint_build(app):
+    """Hashes an app's static files and templates into a build fingerprint.
+
+    Args:
+        app: The flask app whose build to fingerprint, with its static files
+            already fingerprinted
+    """
+    fingerprints = dict(app.extensions.get("static_fingerprints", {}))
+    templates = os.path.join(app.root_path, app.template_folder)
+    fingerprints.update(
+        (f"templates/{name}", fingerprint)
+        for name, fingerprint in fingerprint_files(templates).items()
+    )
+
+    digest = hashlib.sha256()
+    for name, fingerprint in sorted(fingerprints.items()):
+        digest.update(f"{name}={fingerprint}\n".encode())
+
+    modified = [
+        os.path.getmtime(os.path.join(directory, filename))
+        for folder in (app.static_folder, templates)
+        if folder and os.path.isdir(folder)
+        for directory, _, filenames in os.walk(folder)
+        for filename in filenames
+    ]
+    built_at = datetime.utcfromtimestamp(max(modified, default=0))
+
+    app.extensions["build"] = digest.hexdigest()[:12], built_at
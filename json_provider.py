@@ -0,0 +1,57 @@
+"""A json provider for flask encoding responses with orjson when installed.
+
+orjson encodes the large lists of the api several times faster than the
+standard library, without building an intermediate str. It is optional:
+without it, or in debug mode (where responses are indented), flask's
+default encoder is used. Either way keys are sorted and separators compact,
+so the same data always gives the same json, only non-ascii characters are
+sent as utf-8 rather than escaped.
+
+Classes:
+    FastJSONProvider()
+"""
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask's default json provider, encoding responses with orjson.
+
+    Types orjson can't encode (and dates, which it formats differently) are
+    passed to flask's default function as before.
+    """
+
+    def response(self, *args, **kwargs):
+        """Serializes the arguments as a json response, as jsonify does.
+
+        Args:
+            args: A single value to serialize, or several to serialize as a
+                list
+            kwargs: Values to serialize as an object
+
+        Returns:
+            response: A flask Response containing the json
+        """
+        pretty = self.compact is False or (
+            self.compact is None and self._app.debug
+        )
+        if orjson is None or pretty:
+            return super().response(*args, **kwargs)
+
+        options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+
+        obj = self._prepare_response_obj(args, kwargs)
+        try:
+            body = orjson.dumps(obj, default=self.default, option=options)
+        except TypeError:
+            # e.g. ints too large for orjson, which json can encode
+            return super().response(*args, **kwargs)
+
+        return self._app.response_class(body + b"\n", mimetype=self.mimetype)
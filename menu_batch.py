@@ -0,0 +1,381 @@
+"""Validation and bulk application of many changes to a restaurant's menu.
+
+Classes:
+    MenuBatch()
+
+Functions:
+    menu_item_values()
+    is_course()
+    is_menu_item_id()
+    update_params()
+
+Attributes:
+    FIELDS: A tuple of the fields of a menu item sent as json
+    UPDATE_COLUMNS: A tuple of the columns a batch update may change
+    UPDATE_STATEMENT: A sqlalchemy Update of one menu item, setting only the
+        columns flagged in its params, so updates changing different columns
+        are still run as a single executemany
+"""
+
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import bindparam, case, insert, update
+
+from models import SQLITE_INT_RANGE, MenuItem, parse_price
+
+FIELDS = ("name", "course", "description", "price")
+UPDATE_COLUMNS = ("name", "course", "description", "price_cents")
+UPDATE_STATEMENT = (
+    update(MenuItem.__table__)
+    .where(MenuItem.__table__.c.id == bindparam("menu_item_id"))
+    .values(
+        {
+            **{
+                column: case(
+                    (
+                        bindparam(f"set_{column}"),
+                        bindparam(
+                            f"new_{column}",
+                            type_=MenuItem.__table__.c[column].type,
+                        ),
+                    ),
+                    else_=MenuItem.__table__.c[column],
+                )
+                for column in UPDATE_COLUMNS
+            },
+            "updated_at": bindparam(
+                "new_updated_at", type_=MenuItem.__table__.c.updated_at.type
+            ),
+        }
+    )
+)
+
+
+def menu_item_values(data, partial=False):
+    """Validates a menu item sent to the api as json.
+
+    Must be called in an app context, to read the courses a menu has.
+
+    Args:
+        data: A dict representing the fields of the menu item, optionally
+            with its id
+        partial: A bool indicating whether only some fields are being set
+            (an update) rather than all of them (a create)
+
+    Returns:
+        values: A dict mapping the names of MenuItem's columns to the values
+            to store
+
+    Raises:
+        ValueError: If the menu item has unknown or invalid fields
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Menu item must be an object")
+
+    unknown = set(data) - set(FIELDS) - {"id"}
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+
+    values = {}
+    for field in FIELDS:
+        if field in data:
+            if data[field] is not None and not isinstance(data[field], str):
+                raise ValueError(f"Invalid {field}")
+            values[field] = data[field]
+
+    if not is_course(values.get("course")):
+        raise ValueError("Invalid course")
+
+    if "price" in values:
+        values["price_cents"] = parse_price(values.pop("price"))
+
+    if not values.get("name") and ("name" in values or not partial):
+        raise ValueError("Missing name")
+
+    return values
+
+
+def is_course(course):
+    """Checks a course sent for a menu item is one the menu has.
+
+    Must be called in an app context, to read the courses a menu has.
+
+    Args:
+        course: A str representing the course, or None for an uncategorized
+            menu item
+
+    Returns:
+        A bool indicating whether the course is a key of MENU_COURSES or None
+    """
+    return course is None or course in current_app.config["MENU_COURSES"]
+
+
+def is_menu_item_id(value):
+    """Checks a value sent as a menu item's id could be one.
+
+    Args:
+        value: The id sent in the json
+
+    Returns:
+        A bool indicating whether the value is an int (not a bool) within
+            the range sqlite stores integers in
+    """
+    return (
+        isinstance(value, int)
+        and not isinstance(value, bool)
+        and value in SQLITE_INT_RANGE
+    )
+
+
+def update_params(menu_item_id, values):
+    """Builds the params of UPDATE_STATEMENT for one menu item.
+
+    Args:
+        menu_item_id: An int representing the id of the menu item
+        values: A dict mapping the names of the columns to change to their
+            new values
+
+    Returns:
+        params: A dict of a value and a flag for every column in
+            UPDATE_COLUMNS, the same keys whatever columns are changed
+    """
+    params = {
+        "menu_item_id": menu_item_id,
+        "new_updated_at": datetime.utcnow(),
+    }
+    for column in UPDATE_COLUMNS:
+        params[f"set_{column}"] = column in values
+        params[f"new_{column}"] = values.get(column)
+
+    return params
+
+
+class MenuBatch:
+    """A batch of creates, updates and deletes to a restaurant's menu.
+
+    The batch is all or nothing: it is only applied if every change in it is
+    valid. Each change gets a result with a status of created, updated or
+    deleted when applied, invalid or not_found if it is the reason the batch
+    was rejected, or skipped if it was valid but the batch was rejected.
+
+    Attributes:
+        restaurant_id: An int representing the id of the restaurant
+        creates: A list of dicts representing the menu items to create
+        updates: A list of dicts representing the menu items to update
+        deletes: A list of the ids of the menu items to delete
+        results: A dict mapping create, update and delete to a list of dicts
+            representing the result of each change, in the order sent
+    """
+
+    def __init__(self, restaurant_id, batch):
+        """Reads a batch of changes sent to the api as json.
+
+        Args:
+            restaurant_id: An int representing the id of the restaurant
+            batch: A dict with optional create, update and delete lists
+
+        Raises:
+            ValueError: If the batch isn't an object of lists
+        """
+        if not isinstance(batch, dict) or set(batch) - {
+            "create",
+            "update",
+            "delete",
+        }:
+            raise ValueError(
+                "Expected an object with create, update and delete lists"
+            )
+
+        self.restaurant_id = restaurant_id
+        self.creates = batch.get("create", [])
+        self.updates = batch.get("update", [])
+        self.deletes = batch.get("delete", [])
+        if not all(
+            isinstance(changes, list)
+            for changes in (self.creates, self.updates, self.deletes)
+        ):
+            raise ValueError(
+                "Expected an object with create, update and delete lists"
+            )
+
+        self.results = {"create": [], "update": [], "delete": []}
+        self._create_rows = []
+        self._update_rows = []
+        self._delete_ids = []
+        self._seen_ids = set()
+
+    def validate(self, session):
+        """Validates every change, looking up the menu items in one query.
+
+        Args:
+            session: A sqlalchemy Session to query with
+
+        Returns:
+            A bool indicating whether every change is valid
+        """
+        ids = [
+            data.get("id") for data in self.updates if isinstance(data, dict)
+        ]
+        ids = [id_ for id_ in ids + self.deletes if is_menu_item_id(id_)]
+        existing_ids = {
+            row.id
+            for row in session.query(MenuItem.id).filter(
+                MenuItem.restaurant_id == self.restaurant_id,
+                MenuItem.id.in_(ids),
+            )
+        }
+
+        self._validate_creates()
+        self._validate_updates(existing_ids)
+        self._validate_deletes(existing_ids)
+
+        results = [
+            result for section in self.results.values() for result in section
+        ]
+        if all(
+            result["status"] not in ("invalid", "not_found")
+            for result in results
+        ):
+            return True
+
+        for result in results:
+            if result["status"] in ("created", "updated", "deleted"):
+                result["status"] = "skipped"
+        return False
+
+    def _validate_creates(self):
+        """Validates the menu items to create."""
+        for data in self.creates:
+            try:
+                values = menu_item_values(data)
+                if "id" in data:
+                    raise ValueError("Menu items to create can't have an id")
+            except ValueError as error:
+                self.results["create"].append(
+                    {"status": "invalid", "error": str(error)}
+                )
+                continue
+
+            # Every row of an executemany has to set the same columns
+            values = {
+                "name": values["name"],
+                "course": values.get("course"),
+                "description": values.get("description"),
+                "price_cents": values.get("price_cents"),
+                "restaurant_id": self.restaurant_id,
+            }
+            self._create_rows.append(values)
+            self.results["create"].append({"status": "created"})
+
+    def _validate_updates(self, existing_ids):
+        """Validates the menu items to update.
+
+        Args:
+            existing_ids: A set of the ids of the restaurant's menu items
+                among those being changed
+        """
+        for data in self.updates:
+            try:
+                values = menu_item_values(data, partial=True)
+                menu_item_id = self._checked_id(data.get("id"))
+            except ValueError as error:
+                self.results["update"].append(
+                    {"status": "invalid", "error": str(error)}
+                )
+                continue
+
+            if menu_item_id not in existing_ids:
+                self.results["update"].append(
+                    {"id": menu_item_id, "status": "not_found"}
+                )
+                continue
+
+            self._update_rows.append(update_params(menu_item_id, values))
+            self.results["update"].append(
+                {"id": menu_item_id, "status": "updated"}
+            )
+
+    def _validate_deletes(self, existing_ids):
+        """Validates the ids of the menu items to delete.
+
+        Args:
+            existing_ids: A set of the ids of the restaurant's menu items
+                among those being changed
+        """
+        for menu_item_id in self.deletes:
+            try:
+                self._checked_id(menu_item_id)
+            except ValueError as error:
+                self.results["delete"].append(
+                    {
+                        "id": menu_item_id,
+                        "status": "invalid",
+                        "error": str(error),
+                    }
+                )
+                continue
+
+            if menu_item_id not in existing_ids:
+                self.results["delete"].append(
+                    {"id": menu_item_id, "status": "not_found"}
+                )
+                continue
+
+            self._delete_ids.append(menu_item_id)
+            self.results["delete"].append(
+                {"id": menu_item_id, "status": "deleted"}
+            )
+
+    def _checked_id(self, menu_item_id):
+        """Checks a menu item id is valid and not changed twice in the batch.
+
+        Args:
+            menu_item_id: The id sent for a menu item to update or delete
+
+        Returns:
+            menu_item_id: The id unchanged
+
+        Raises:
+            ValueError: If the id isn't an int sqlite can store or was
+                already seen
+        """
+        if not is_menu_item_id(menu_item_id) or menu_item_id in self._seen_ids:
+            raise ValueError("Invalid id")
+
+        self._seen_ids.add(menu_item_id)
+        return menu_item_id
+
+    def apply(self, session):
+        """Applies a validated batch with bulk statements.
+
+        The changes are added to the session's transaction, which the caller
+        commits. The ids of created menu items are added to their results.
+
+        Args:
+            session: A sqlalchemy Session to apply the changes with
+        """
+        if self._create_rows:
+            session.execute(insert(MenuItem), self._create_rows)
+            # The transaction holds sqlite's write lock since the insert, so
+            # the restaurant's newest menu items are the ones just created,
+            # with ids ascending in the order they were sent
+            created_ids = [
+                row.id
+                for row in session.query(MenuItem.id)
+                .filter(MenuItem.restaurant_id == self.restaurant_id)
+                .order_by(MenuItem.id.desc())
+                .limit(len(self._create_rows))
+            ]
+            for result, menu_item_id in zip(
+                self.results["create"], reversed(created_ids)
+            ):
+                result["id"] = menu_item_id
+
+        if self._update_rows:
+            session.execute(UPDATE_STATEMENT, self._update_rows)
+
+        if self._delete_ids:
+            session.query(MenuItem).filter(
+                MenuItem.id.in_(self._delete_ids)
+            ).delete(synchronize_session=False)
@@ -0,0 +1,347 @@
+"""Request, db and template timings exposed in prometheus' text format.
+
+Every request's latency is recorded by endpoint and status code, along with
+the number of sql queries it ran, the time spent in them and the time spent
+rendering templates. Recording a value only takes a lock and a bisect, so
+the metrics can be left on permanently. They are kept per process.
+
+Attributes:
+    LATENCY_BUCKETS: A tuple of the upper bounds, in seconds, of the buckets
+        of the latency histograms
+    QUERY_BUCKETS: A tuple of the upper bounds of the buckets of the query
+        count histogram
+
+Classes:
+    Histogram()
+    RequestTimings()
+    Metrics()
+"""
+
+import threading
+import time
+from bisect import bisect_left
+
+from flask import (
+    before_render_template,
+    g,
+    has_request_context,
+    request,
+    template_rendered,
+)
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+
+class Histogram:
+    """A thread-safe prometheus histogram with labels.
+
+    Attributes:
+        name: A str representing the name of the metric
+        description: A str describing the metric
+        labels: A tuple of the names of the labels
+        buckets: A tuple of the upper bounds of the buckets, in order
+    """
+
+    def __init__(self, name, description, labels, buckets=LATENCY_BUCKETS):
+        """Creates a histogram with no observations.
+
+        Args:
+            name: A str representing the name of the metric
+            description: A str describing the metric
+            labels: A tuple of the names of the labels
+            buckets: A tuple of the upper bounds of the buckets, in order
+        """
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        """Records a value.
+
+        Args:
+            value: A float representing the value observed
+            label_values: The value of each label, in the order of labels
+        """
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = {
+                    "counts": [0] * (len(self.buckets) + 1),
+                    "sum": 0.0,
+                }
+            series["counts"][index] += 1
+            series["sum"] += value
+
+    def render(self):
+        """Formats the histogram in prometheus' text format.
+
+        Returns:
+            lines: A list of strs, one per line of the exposition
+        """
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            series = [
+                (label_values, list(values["counts"]), values["sum"])
+                for label_values, values in sorted(self._series.items())
+            ]
+
+        for label_values, counts, total in series:
+            labels = ",".join(
+                f'{label}="{escape(value)}"'
+                for label, value in zip(self.labels, label_values)
+            )
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                lines.append(
+                    f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+                )
+            lines.append(f"{self.name}_sum{{{labels}}} {total}")
+            lines.append(f"{self.name}_count{{{labels}}} {cumulative}")
+
+        return lines
+
+
+def escape(value):
+    """Escapes a label value for prometheus' text format.
+
+    Args:
+        value: The value of a label
+
+    Returns:
+        A str with backslashes, quotes and newlines escaped
+    """
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace('"', '\\"')
+        .replace("\n", "\\n")
+    )
+
+
+class RequestTimings:  # pylint: disable=too-few-public-methods
+    """The timings of the request being handled, kept in flask's g.
+
+    Attributes:
+        start: A float representing the perf_counter when the request started
+        status: An int representing the status code of the response
+        queries: An int representing the number of sql queries run so far
+        db_time: A float representing the seconds spent in sql queries so far
+        template_start: A float representing the perf_counter when the
+            template being rendered started, or None
+    """
+
+    __slots__ = ("start", "status", "queries", "db_time", "template_start")
+
+    def __init__(self):
+        """Starts timing a request."""
+        self.start = time.perf_counter()
+        self.status = 500
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_start = None
+
+
+class Metrics:
+    """Collects the timings of an app's requests, queries and templates.
+
+    Attributes:
+        request_duration: A Histogram of request latencies by endpoint and
+            status code
+        db_queries: A Histogram of the number of sql queries per request by
+            endpoint
+        db_duration: A Histogram of the time spent in sql queries per request
+            by endpoint
+        template_duration: A Histogram of template render times by template
+    """
+
+    def __init__(self):
+        """Creates the histograms with no observations."""
+        self.request_duration = Histogram(
+            "http_request_duration_seconds",
+            "Time taken to handle a request.",
+            ("endpoint", "status"),
+        )
+        self.db_queries = Histogram(
+            "http_request_db_queries",
+            "Number of sql queries run by a request.",
+            ("endpoint",),
+            QUERY_BUCKETS,
+        )
+        self.db_duration = Histogram(
+            "http_request_db_duration_seconds",
+            "Time a request spent running sql queries.",
+            ("endpoint",),
+        )
+        self.template_duration = Histogram(
+            "template_render_duration_seconds",
+            "Time taken to render a template.",
+            ("template",),
+        )
+
+    def init_app(self, app):
+        """Times every request of an app and the templates it renders.
+
+        Args:
+            app: The flask app to instrument
+        """
+        app.before_request(self._start_request)
+        app.after_request(self._record_status)
+        app.teardown_request(self._finish_request)
+        before_render_template.connect(self._start_template, app)
+        template_rendered.connect(self._finish_template, app)
+
+    def instrument_engine(self, engine):
+        """Counts and times the queries an engine runs during requests.
+
+        Args:
+            engine: A sqlalchemy Engine (the sync_engine of an AsyncEngine)
+        """
+        event.listen(engine, "before_cursor_execute", self._start_query)
+        event.listen(engine, "after_cursor_execute", self._finish_query)
+
+    @staticmethod
+    def _start_request():
+        """Starts the request's timer and query counters."""
+        g.metrics = RequestTimings()
+
+    @staticmethod
+    def _record_status(response):
+        """Notes the status code of the response.
+
+        Args:
+            response: The flask Response being sent
+
+        Returns:
+            response: The same response
+        """
+        g.metrics.status = response.status_code
+        return response
+
+    def _finish_request(
+        self, exception=None
+    ):  # pylint: disable=unused-argument
+        """Records the request's timings once it has been handled.
+
+        Args:
+            exception: The exception that ended the request, if any (unused)
+        """
+        timings = g.pop("metrics", None)
+        if timings is None:
+            return
+
+        endpoint = request.endpoint or "none"
+        self.request_duration.observe(
+            time.perf_counter() - timings.start, endpoint, timings.status
+        )
+        self.db_queries.observe(timings.queries, endpoint)
+        self.db_duration.observe(timings.db_time, endpoint)
+
+    @staticmethod
+    def _start_query(
+        conn, cursor, statement, parameters, context, executemany
+    ):  # pylint: disable=too-many-arguments,unused-argument
+        """Notes when a query starts, see sqlalchemy's before_cursor_execute.
+
+        Args:
+            conn: The sqlalchemy Connection running the query (unused)
+            cursor: The dbapi cursor (unused)
+            statement: The sql str (unused)
+            parameters: The query's parameters (unused)
+            context: The ExecutionContext of the query
+            executemany: A bool indicating an executemany call (unused)
+        """
+        context.metrics_start = time.perf_counter()
+
+    @staticmethod
+    def _finish_query(
+        conn, cursor, statement, parameters, context, executemany
+    ):  # pylint: disable=too-many-arguments,unused-argument
+        """Adds a finished query to the request's counters.
+
+        Args:
+            conn: The sqlalchemy Connection running the query (unused)
+            cursor: The dbapi cursor (unused)
+            statement: The sql str (unused)
+            parameters: The query's parameters (unused)
+            context: The ExecutionContext of the query
+            executemany: A bool indicating an executemany call (unused)
+        """
+        timings = g.get("metrics") if has_request_context() else None
+        if timings is not None:
+            timings.queries += 1
+            timings.db_time += time.perf_counter() - context.metrics_start
+
+    @staticmethod
+    def _start_template(
+        sender, template, context, **extra
+    ):  # pylint: disable=unused-argument
+        """Notes when a template starts rendering.
+
+        Args:
+            sender: The flask app rendering the template (unused)
+            template: The jinja Template being rendered (unused)
+            context: The template's context (unused)
+            extra: Any other arguments of the signal (unused)
+        """
+        timings = g.get("metrics") if has_request_context() else None
+        if timings is not None:
+            timings.template_start = time.perf_counter()
+
+    def _finish_template(
+        self, sender, template, context, **extra
+    ):  # pylint: disable=unused-argument
+        """Records the render time of a template.
+
+        Args:
+            sender: The flask app rendering the template (unused)
+            template: The jinja Template rendered
+            context: The template's context (unused)
+            extra: Any other arguments of the signal (unused)
+        """
+        timings = g.get("metrics") if has_request_context() else None
+        if timings is not None and timings.template_start is not None:
+            self.template_duration.observe(
+                time.perf_counter() - timings.template_start, template.name
+            )
+            timings.template_start = None
+
+    def render(self):
+        """Formats every metric in prometheus' text format.
+
+        Returns:
+            A str of the exposition, ending with a newline
+        """
+        lines = []
+        for histogram in (
+            self.request_duration,
+            self.db_queries,
+            self.db_duration,
+            self.template_duration,
+        ):
+            lines.extend(histogram.render())
+
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,297 @@
+"""Versioned schema migrations for the sqlite db.
+
+The schema version of a db is stored in sqlite's user_version pragma and each
+migration brings the db up by exactly one version. Migrations are written as
+plain DDL against the tables as they were at the time, so they never depend on
+the current state of models.py. Every step is idempotent, which lets it run
+safely on dbs that were created before the db was versioned.
+
+The app's own db can also be migrated with its engine and settings through
+flask's command line.
+
+Usage: migrations.py [database_uri]
+    flask init-db
+
+Attributes:
+    MIGRATIONS: A list of functions, each applying one version of the schema
+"""
+
+import argparse
+
+import click
+from flask import current_app
+from sqlalchemy import create_engine
+
+from config import Config
+
+MIGRATIONS = []
+
+
+def migration(function):
+    """Registers a function as the next migration step.
+
+    Args:
+        function: A function taking a sqlalchemy Connection and applying one
+            version of the schema
+
+    Returns:
+        function: The given function unchanged
+    """
+    MIGRATIONS.append(function)
+    return function
+
+
+@migration
+def create_tables(connection):
+    """Creates the restaurants and menu_items tables if they don't exist.
+
+    Args:
+        connection: A sqlalchemy Connection with an open transaction
+    """
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS restaurants (
+            id INTEGER NOT NULL,
+            name VARCHAR(80) NOT NULL,
+            PRIMARY KEY (id)
+        )
+        """)
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS menu_items (
+            id INTEGER NOT NULL,
+            name VARCHAR(80) NOT NULL,
+            course VARCHAR(250),
+            description VARCHAR(250),
+            price VARCHAR(8),
+            restaurant_id INTEGER,
+            PRIMARY KEY (id),
+            FOREIGN KEY(restaurant_id) REFERENCES restaurants (id)
+        )
+        """)
+
+
+@migration
+def add_menu_item_indexes(connection):
+    """Indexes menu items by restaurant so menus aren't full table scans.
+
+    Args:
+        connection: A sqlalchemy Connection with an open transaction
+    """
+    connection.execute(
+        "CREATE INDEX IF NOT EXISTS ix_menu_items_restaurant_id_course "
+        "ON menu_items (restaurant_id, course)"
+    )
+    connection.execute(
+        "CREATE INDEX IF NOT EXISTS ix_menu_items_restaurant_id_id "
+        "ON menu_items (restaurant_id, id)"
+    )
+
+
+@migration
+def add_change_tracking(connection):
+    """Adds the columns used to answer conditional GETs.
+
+    Args:
+        connection: A sqlalchemy Connection with an open transaction
+    """
+    add_column(
+        connection,
+        "restaurants",
+        "version",
+        "INTEGER NOT NULL DEFAULT 1",
+    )
+    add_column(connection, "restaurants", "updated_at", "DATETIME")
+    add_column(connection, "menu_items", "updated_at", "DATETIME")
+
+    now = "strftime('%Y-%m-%d %H:%M:%f000', 'now')"
+    for table in ("restaurants", "menu_items"):
+        connection.execute(
+            f"UPDATE {table} SET updated_at = {now} WHERE updated_at IS NULL"
+        )
+
+
+@migration
+def add_price_cents(connection):
+    """Stores prices as integer cents so they can be sorted and filtered.
+
+    Existing prices are converted from strs like "$7.50". Prices that aren't
+    plain amounts are left without a price in cents. The old price column is
+    kept (unused) as sqlite can't drop columns.
+
+    Args:
+        connection: A sqlalchemy Connection with an open transaction
+    """
+    add_column(connection, "menu_items", "price_cents", "INTEGER")
+    connection.execute(
+        "CREATE INDEX IF NOT EXISTS ix_menu_items_restaurant_id_price_cents "
+        "ON menu_items (restaurant_id, price_cents)"
+    )
+
+    if "price" not in get_columns(connection, "menu_items"):
+        return
+
+    amount = "REPLACE(REPLACE(TRIM(price), '$', ''), ',', '')"
+    connection.execute(f"""
+        UPDATE menu_items
+        SET price_cents = CAST(ROUND(CAST({amount} AS REAL) * 100) AS INTEGER)
+        WHERE price_cents IS NULL
+            AND {amount} != ''
+            AND {amount} NOT GLOB '*[^0-9.]*'
+            AND {amount} NOT GLOB '*.*.*'
+        """)
+
+
+@migration
+def add_menu_item_search(connection):
+    """Adds a full-text index of menu item names and descriptions.
+
+    The index is an fts5 table reading its content from menu_items, kept in
+    sync by triggers so every insert, update and delete (including bulk
+    loads) is reflected without any changes to the code writing them.
+
+    Args:
+        connection: A sqlalchemy Connection with an open transaction
+    """
+    connection.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS menu_items_fts USING fts5(
+            name,
+            description,
+            content='menu_items',
+            content_rowid='id',
+            tokenize='porter unicode61'
+        )
+        """)
+    connection.execute("""
+        CREATE TRIGGER IF NOT EXISTS menu_items_fts_insert
+        AFTER INSERT ON menu_items BEGIN
+            INSERT INTO menu_items_fts (rowid, name, description)
+            VALUES (new.id, new.name, new.description);
+        END
+        """)
+    connection.execute("""
+        CREATE TRIGGER IF NOT EXISTS menu_items_fts_delete
+        AFTER DELETE ON menu_items BEGIN
+            INSERT INTO menu_items_fts (
+                menu_items_fts, rowid, name, description
+            ) VALUES ('delete', old.id, old.name, old.description);
+        END
+        """)
+    connection.execute("""
+        CREATE TRIGGER IF NOT EXISTS menu_items_fts_update
+        AFTER UPDATE OF name, description ON menu_items BEGIN
+            INSERT INTO menu_items_fts (
+                menu_items_fts, rowid, name, description
+            ) VALUES ('delete', old.id, old.name, old.description);
+            INSERT INTO menu_items_fts (rowid, name, description)
+            VALUES (new.id, new.name, new.description);
+        END
+        """)
+    connection.execute(
+        "INSERT INTO menu_items_fts (menu_items_fts) VALUES ('rebuild')"
+    )
+
+
+@migration
+def add_menu_snapshots(connection):
+    """Adds the table of serialized menus, one row per restaurant.
+
+    The table starts empty, as snapshots are serialized by the app: menus
+    without one are served from menu_items until they change or
+    `flask rebuild-snapshots` is run.
+
+    Args:
+        connection: A sqlalchemy Connection with an open transaction
+    """
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS menu_snapshots (
+            restaurant_id INTEGER NOT NULL,
+            version INTEGER NOT NULL,
+            updated_at DATETIME,
+            menu TEXT NOT NULL,
+            PRIMARY KEY (restaurant_id),
+            FOREIGN KEY(restaurant_id) REFERENCES restaurants (id)
+        )
+        """)
+
+
+def add_column(connection, table, column, definition):
+    """Adds a column to a table unless it already exists.
+
+    Args:
+        connection: A sqlalchemy Connection with an open transaction
+        table: A str representing the name of the table
+        column: A str representing the name of the column to add
+        definition: A str representing the type and constraints of the column
+    """
+    if column not in get_columns(connection, table):
+        connection.execute(
+            f"ALTER TABLE {table} ADD COLUMN {column} {definition}"
+        )
+
+
+def get_columns(connection, table):
+    """Retrieves the names of the columns of a table.
+
+    Args:
+        connection: A sqlalchemy Connection to the db
+        table: A str representing the name of the table
+
+    Returns:
+        columns: A set of strs representing the names of the columns
+    """
+    columns = {
+        row[1] for row in connection.execute(f"PRAGMA table_info({table})")
+    }
+    return columns
+
+
+def get_version(connection):
+    """Retrieves the schema version of a db.
+
+    Args:
+        connection: A sqlalchemy Connection to the db
+
+    Returns:
+        version: An int representing the schema version of the db
+    """
+    version = connection.execute("PRAGMA user_version").scalar()
+    return version
+
+
+def upgrade(engine):
+    """Applies all pending migrations to a db in a single transaction.
+
+    Args:
+        engine: A sqlalchemy Engine with a connection to the db to upgrade
+
+    Returns:
+        version: An int representing the schema version of the db afterwards
+    """
+    with engine.begin() as connection:
+        version = get_version(connection)
+        for function in MIGRATIONS[version:]:
+            function(connection)
+            version += 1
+            connection.execute(f"PRAGMA user_version = {version}")
+
+    return version
+
+
+@click.command("init-db")
+def init_db_command():
+    """Creates or upgrades the app's db to the latest schema version."""
+    version = upgrade(current_app.extensions["engine"])
+    click.echo(f"Database is at version {version}")
+
+
+def main():
+    """Upgrades the db given on the command line to the latest version."""
+    parser = argparse.ArgumentParser(description="Migrates the sqlite db.")
+    parser.add_argument("database_uri", nargs="?", default=Config.DATABASE_URI)
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_uri)
+    print(f"Database is at version {upgrade(engine)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,118 @@
 """Model objects used to model data for the db.
 
-Attributes:
-    engine: A sqlalchemy Engine object with a connection to the sqlite db
+Importing the models doesn't touch the db: its schema is created and
+upgraded by the migrations, see migrations.py.
 
 Classes:
     Base()
     Restaurant()
     MenuItem()
+    MenuSnapshot()
+
+Functions:
+    parse_int()
+    parse_price()
+    format_price()
+
+Attributes:
+    SQLITE_INT_RANGE: A range of the ints sqlite can store (signed 64 bit)
+    PRICE_PATTERN: A compiled regex matching a price of dollars (which may be
+        left out, as in "$.99") with up to two decimal places, capturing the
+        dollars and cents
+    MAX_PRICE_CENTS: An int representing the highest price accepted, in
+        cents ($1,000,000.00)
 """
 
-from sqlalchemy import Column, ForeignKey, Integer, String, create_engine
+import re
+from datetime import datetime
+
+from sqlalchemy import (
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Text,
+)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 
 Base = declarative_base()
 
+SQLITE_INT_RANGE = range(-(2**63), 2**63)
+PRICE_PATTERN = re.compile(r"^\$?(\d{0,9})(?:\.(\d{1,2}))?$")
+MAX_PRICE_CENTS = 100_000_000
+
+
+def parse_int(value):
+    """Parses an int sent by a client that is compared with a db column.
+
+    Args:
+        value: A str representing the int
+
+    Returns:
+        An int within the range sqlite stores integers in
+
+    Raises:
+        ValueError: If the str isn't an int or is out of sqlite's range
+    """
+    number = int(value)
+    if number not in SQLITE_INT_RANGE:
+        raise ValueError(f"Out of range: {value!r}")
+
+    return number
+
+
+def parse_price(price):
+    """Parses a price such as "$7.50" into an int number of cents.
+
+    Args:
+        price: A str representing a price, with or without a leading "$"
+
+    Returns:
+        cents: An int representing the price in cents, or None if no price
+            is given
+
+    Raises:
+        ValueError: If the str isn't a non-negative amount of whole cents of
+            at most MAX_PRICE_CENTS
+    """
+    if price is None:
+        return None
+
+    price = price.strip().replace(",", "")
+    if not price.lstrip("$"):
+        return None
+
+    match = PRICE_PATTERN.match(price)
+    if match is None:
+        raise ValueError(f"Invalid price: {price!r}")
+
+    # An empty price (both groups empty) was already returned as no price
+    dollars, cents = match.groups()
+    cents = int(dollars or 0) * 100 + int((cents or "").ljust(2, "0"))
+    if cents > MAX_PRICE_CENTS:
+        raise ValueError(f"Invalid price: {price!r}")
+
+    return cents
+
+
+def format_price(cents):
+    """Formats an int number of cents as a price such as "$7.50".
+
+    Args:
+        cents: An int representing a price in cents, or None
+
+    Returns:
+        price: A str representing the price, or None if cents is None
+    """
+    if cents is None:
+        return None
+
+    price = f"${cents // 100}.{cents % 100:02d}"
+    return price
+
 
 class Restaurant(Base):
     """A model representing a restaurant.
@@ -22,12 +120,20 @@ class Restaurant(Base):
     Attributes:
         id: An int that serves as the unique identifier for the restaurant
         name: A str representing the name of the restaurant
+        version: An int incremented whenever the restaurant or its menu
+            changes
+        updated_at: A datetime (utc) of the last change to the restaurant or
+            its menu
     """
 
     __tablename__ = "restaurants"
 
     id = Column(Integer, primary_key=True)
     name = Column(String(80), nullable=False)
+    version = Column(Integer, nullable=False, default=1)
+    updated_at = Column(
+        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
+    )
 
     @property
     def serialize(self):
@@ -39,6 +145,32 @@ class Restaurant(Base):
         restaurant = {"id": self.id, "name": self.name}
         return restaurant
 
+    @classmethod
+    def serialize_columns(cls):
+        """Lists the columns serialize_row needs, to select them as a row.
+
+        Returns:
+            A tuple of the columns, in the order serialize_row expects
+        """
+        return (cls.id, cls.name)
+
+    @staticmethod
+    def serialize_row(row):
+        """Serializes a row of serialize_columns as serialize does.
+
+        Selecting only these columns skips building a Restaurant object for
+        every row, which is most of the cost of serializing long lists.
+
+        Args:
+            row: A sequence of the values of serialize_columns
+
+        Returns:
+            restaurant: A dict representing the restaurant
+        """
+        restaurant_id, name = row
+        restaurant = {"id": restaurant_id, "name": name}
+        return restaurant
+
 
 class MenuItem(Base):
     """A model representing a menu item.
@@ -48,20 +180,56 @@ class MenuItem(Base):
         name: A str representing the name of the menu item
         course: A str representing the course the menu item belongs to
         description: A str respresenting a description of the menu item
-        price: A str representing the price of the menu item
+        price_cents: An int representing the price of the menu item in cents
+        price: A str representing the price of the menu item, formatted from
+            (and parsed into) price_cents
         restaurant_id: The id of the restaurant the menu item belongs to
+        updated_at: A datetime (utc) of the last change to the menu item
     """
 
     __tablename__ = "menu_items"
+    __table_args__ = (
+        Index("ix_menu_items_restaurant_id_course", "restaurant_id", "course"),
+        Index("ix_menu_items_restaurant_id_id", "restaurant_id", "id"),
+        Index(
+            "ix_menu_items_restaurant_id_price_cents",
+            "restaurant_id",
+            "price_cents",
+        ),
+    )
 
     id = Column(Integer, primary_key=True)
     name = Column(String(80), nullable=False)
     course = Column(String(250))
     description = Column(String(250))
-    price = Column(String(8))
+    price_cents = Column(Integer)
     restaurant_id = Column(Integer, ForeignKey("restaurants.id"))
+    updated_at = Column(
+        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
+    )
     restaurant = relationship(Restaurant)
 
+    @property
+    def price(self):
+        """Formats the price of the menu item for display.
+
+        Returns:
+            price: A str representing the price, such as "$7.50"
+        """
+        return format_price(self.price_cents)
+
+    @price.setter
+    def price(self, price):
+        """Sets the price of the menu item from a str such as "$7.50".
+
+        Args:
+            price: A str representing the price
+
+        Raises:
+            ValueError: If the str isn't a valid price
+        """
+        self.price_cents = parse_price(price)
+
     @property
     def serialize(self):
         """Serializes the menu item object as a dict.
@@ -78,7 +246,57 @@ class MenuItem(Base):
         }
         return menu_item
 
+    @classmethod
+    def serialize_columns(cls):
+        """Lists the columns serialize_row needs, to select them as a row.
+
+        Returns:
+            A tuple of the columns, in the order serialize_row expects
+        """
+        return (cls.id, cls.name, cls.course, cls.description, cls.price_cents)
+
+    @staticmethod
+    def serialize_row(row):
+        """Serializes a row of serialize_columns as serialize does.
+
+        Args:
+            row: A sequence of the values of serialize_columns
+
+        Returns:
+            menu_item: A dict representing the menu item
+        """
+        menu_item_id, name, course, description, price_cents = row
+        menu_item = {
+            "id": menu_item_id,
+            "name": name,
+            "course": course,
+            "description": description,
+            "price": format_price(price_cents),
+        }
+        return menu_item
+
+
+class MenuSnapshot(Base):
+    """A model representing the serialized menu of a restaurant.
+
+    Snapshots are kept up to date by the app in the same transaction as
+    every change to a restaurant or its menu, see snapshots.py.
+
+    Attributes:
+        restaurant_id: The id of the restaurant whose menu is serialized
+        version: An int copied from the restaurant's version when the
+            snapshot was taken
+        updated_at: A datetime (utc) copied from the restaurant's updated_at
+            when the snapshot was taken
+        menu: A str of the json the menu items api responds with for the
+            restaurant's full menu
+    """
 
-engine = create_engine("sqlite:///restaurant_menu.db")
+    __tablename__ = "menu_snapshots"
 
-Base.metadata.create_all(engine)
+    restaurant_id = Column(
+        Integer, ForeignKey("restaurants.id"), primary_key=True
+    )
+    version = Column(Integer, nullable=False)
+    updated_at = Column(DateTime)
+    menu = Column(Text, nullable=False)
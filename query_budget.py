@@ -0,0 +1,86 @@
+"""Per-route limits on the number of sql queries a request may run.
+
+Routes declare the most queries they need with the query_budget decorator,
+which should not depend on the size of the data they show. A route running
+more, such as one lazy loading a relationship for every row it renders
+(an N+1 query), is reported in the log or fails the request, depending on
+the QUERY_BUDGET_MODE setting. Queries are counted by the app's Metrics.
+
+Classes:
+    QueryBudgetError()
+
+Functions:
+    query_budget()
+    check_request()
+    check_query_budgets()
+"""
+
+from flask import current_app, g, request
+
+
+class QueryBudgetError(Exception):
+    """Raised when a request runs more sql queries than its route allows."""
+
+
+def query_budget(queries):
+    """Declares the most sql queries a route may run per request.
+
+    Args:
+        queries: An int representing the number of queries allowed, or None
+            for a route whose queries can't be checked (one streaming its
+            body, as the check runs before the body is sent)
+
+    Returns:
+        decorator: A function setting the budget on a view function
+    """
+
+    def decorator(view):
+        view.query_budget = queries
+        return view
+
+    return decorator
+
+
+def check_request(response):
+    """Compares the queries run by the request with its route's budget.
+
+    The number of queries is also sent in an X-Query-Count header.
+
+    Args:
+        response: The flask Response being sent
+
+    Returns:
+        response: The same response
+
+    Raises:
+        QueryBudgetError: If the budget is exceeded in raise mode
+    """
+    timings = g.get("metrics")
+    if timings is None:
+        return response
+
+    response.headers["X-Query-Count"] = str(timings.queries)
+    view = current_app.view_functions.get(request.endpoint)
+    budget = getattr(view, "query_budget", None)
+    if budget is None or timings.queries <= budget:
+        return response
+
+    message = (
+        f"{request.method} {request.path} ran {timings.queries} queries, "
+        f"over the budget of {budget} for {request.endpoint}"
+    )
+    if current_app.config["QUERY_BUDGET_MODE"] == "raise":
+        raise QueryBudgetError(message)
+    current_app.logger.warning(message)
+
+    return response
+
+
+def check_query_budgets(app):
+    """Checks the query budgets of an app's routes unless they're turned off.
+
+    Args:
+        app: The flask app whose requests to check
+    """
+    if app.config["QUERY_BUDGET_MODE"] != "off":
+        app.after_request(check_request)
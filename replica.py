@@ -0,0 +1,96 @@
+"""A replica of the sqlite db for GET requests to read from.
+
+Pointing READ_DATABASE_URI at another sqlite file moves every read off the
+writer's file. The replica is copied from the writer's db with sqlite's
+online backup, which takes a consistent snapshot without blocking writers
+for more than a moment, and replaces the replica's contents in a single
+transaction so readers see either the old copy or the new one. Reads lag
+behind writes until the next sync, so sync often, e.g. with --interval.
+
+Usage: flask sync-replica [--interval SECONDS]
+
+Functions:
+    sqlite_path()
+    sync_replica()
+    sync_replica_command()
+"""
+
+import sqlite3
+import time
+from contextlib import closing
+from urllib.parse import unquote, urlsplit
+
+import click
+from flask import current_app
+from sqlalchemy.engine import make_url
+
+
+def sqlite_path(database_uri):
+    """Finds the path of the file of a sqlite db from its url.
+
+    Args:
+        database_uri: A str representing the sqlalchemy url of the db
+
+    Returns:
+        path: A str representing the path of the db's file
+
+    Raises:
+        ValueError: If the url isn't for a sqlite file
+    """
+    url = make_url(database_uri)
+    path = url.database
+    if url.get_backend_name() != "sqlite" or path in (None, "", ":memory:"):
+        raise ValueError(f"Not a sqlite file: {database_uri}")
+
+    if url.query.get("uri"):
+        path = unquote(urlsplit(path).path)
+
+    return path
+
+
+def sync_replica(source_path, replica_path, timeout=30):
+    """Copies a sqlite db over its replica.
+
+    Args:
+        source_path: A str representing the path of the db to copy
+        replica_path: A str representing the path of the replica, which is
+            created if it doesn't exist
+        timeout: A float representing the number of seconds to wait for
+            readers of the replica to release it
+
+    Returns:
+        A float representing the number of seconds the copy took
+    """
+    start = time.perf_counter()
+    with closing(sqlite3.connect(source_path)) as source, closing(
+        sqlite3.connect(replica_path, timeout=timeout)
+    ) as replica:
+        source.backup(replica)
+
+    return time.perf_counter() - start
+
+
+@click.command("sync-replica")
+@click.option(
+    "--interval",
+    type=float,
+    help="Seconds between syncs, to keep syncing until stopped.",
+)
+def sync_replica_command(interval):
+    """Copies the app's db to the replica set as its READ_DATABASE_URI."""
+    config = current_app.config
+    if not config["READ_DATABASE_URI"]:
+        raise click.UsageError("READ_DATABASE_URI isn't set")
+
+    try:
+        source_path = sqlite_path(config["DATABASE_URI"])
+        replica_path = sqlite_path(config["READ_DATABASE_URI"])
+    except ValueError as error:
+        raise click.UsageError(str(error)) from error
+
+    while True:
+        elapsed = sync_replica(source_path, replica_path)
+        click.echo(f"Synced {replica_path} in {elapsed * 1000:.1f} ms")
+        if interval is None:
+            return
+        time.sleep(interval)
@@ -0,0 +1,87 @@
+"""Full-text search of menu items, backed by the menu_items_fts table.
+
+The fts5 table and the triggers keeping it in sync with menu_items are
+created by the add_menu_item_search migration.
+
+Functions:
+    match_query()
+    search()
+"""
+
+import re
+
+from sqlalchemy import text
+
+from models import format_price
+
+SEARCH_SQL = text("""
+    SELECT
+        menu_items.id,
+        menu_items.name,
+        menu_items.course,
+        menu_items.description,
+        menu_items.price_cents,
+        restaurants.id AS restaurant_id,
+        restaurants.name AS restaurant_name
+    FROM menu_items_fts
+    JOIN menu_items ON menu_items.id = menu_items_fts.rowid
+    JOIN restaurants ON restaurants.id = menu_items.restaurant_id
+    WHERE menu_items_fts MATCH :query
+    ORDER BY menu_items_fts.rank
+    LIMIT :limit
+    """)
+
+
+def match_query(terms):
+    """Builds an fts5 query matching every word in a search as a prefix.
+
+    Words are quoted, so punctuation or fts5 operators typed by a customer
+    are searched for literally instead of breaking the query.
+
+    Args:
+        terms: A str representing what the customer searched for
+
+    Returns:
+        query: A str representing the fts5 query, or None if the search has
+            no words in it
+    """
+    words = re.findall(r"\w+", terms)
+    if not words:
+        return None
+
+    query = " ".join(f'"{word}"*' for word in words)
+    return query
+
+
+def search(session, terms, limit):
+    """Finds the menu items best matching a search, with their restaurant.
+
+    Args:
+        session: A sqlalchemy Session to query with
+        terms: A str representing what the customer searched for
+        limit: An int representing the maximum number of results
+
+    Returns:
+        results: A list of dicts representing the matching menu items, best
+            match first, each with the restaurant it belongs to
+    """
+    query = match_query(terms)
+    if query is None:
+        return []
+
+    rows = session.execute(SEARCH_SQL, {"query": query, "limit": limit})
+    results = [
+        {
+            "id": row.id,
+            "name": row.name,
+            "course": row.course,
+            "description": row.description,
+            "price": format_price(row.price_cents),
+            "restaurant": {
+                "id": row.restaurant_id,
+                "name": row.restaurant_name,
+            },
+        }
+        for row in rows
+    ]
+    return results
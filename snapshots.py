@@ -0,0 +1,232 @@
+"""Materialized snapshots of the json of each restaurant's full menu.
+
+Serving a restaurant's menu from the api selects and serializes every one of
+its menu items. A snapshot stores the serialized response in the
+menu_snapshots table instead, so it is served with a single primary key
+lookup. The app refreshes a restaurant's snapshot in the same transaction as
+every change to the restaurant or its menu, so a snapshot is never seen out
+of step with the menu it was taken from. Restaurants written outside the app
+(e.g. by bulk_load.py) have no snapshot and are served from menu_items until
+their menu changes or the snapshots are rebuilt.
+
+Usage: flask rebuild-snapshots
+    flask check-snapshots
+
+Attributes:
+    REBUILD_BATCH_SIZE: An int representing the number of snapshots written
+        per statement when rebuilding them
+
+Functions:
+    serialize_snapshots()
+    upsert_snapshots()
+    refresh_snapshot()
+    rebuild_snapshots()
+    check_snapshots()
+    rebuild_snapshots_command()
+    check_snapshots_command()
+"""
+
+import json
+import time
+from itertools import groupby, islice
+from operator import itemgetter
+
+import click
+from flask import jsonify
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.sqlite import insert
+
+from database import session
+from models import MenuItem, MenuSnapshot, Restaurant
+
+REBUILD_BATCH_SIZE = 1000
+
+
+def serialize_snapshots(db, restaurant_ids=None):
+    """Serializes the full menus of restaurants as the menu items api does.
+
+    Every menu is read with a single query, however many restaurants there
+    are. Must be called in an app context, to serialize with the app's json
+    provider.
+
+    Args:
+        db: A sqlalchemy Session to query with
+        restaurant_ids: A list of ints representing the ids of the
+            restaurants, or None for every restaurant
+
+    Yields:
+        snapshot: A dict of the values of a MenuSnapshot's columns, for each
+            restaurant that exists in order of id
+    """
+    statement = (
+        select(
+            Restaurant.id,
+            Restaurant.version,
+            Restaurant.updated_at,
+            *MenuItem.serialize_columns(),
+        )
+        .outerjoin(MenuItem, MenuItem.restaurant_id == Restaurant.id)
+        .order_by(Restaurant.id, MenuItem.id)
+    )
+    if restaurant_ids is not None:
+        statement = statement.where(Restaurant.id.in_(restaurant_ids))
+
+    for (restaurant_id, version, updated_at), rows in groupby(
+        db.execute(statement), key=itemgetter(0, 1, 2)
+    ):
+        # A restaurant without menu items is a single row of NULL items
+        menu_items = [
+            MenuItem.serialize_row(row[3:])
+            for row in rows
+            if row[3] is not None
+        ]
+        yield {
+            "restaurant_id": restaurant_id,
+            "version": version,
+            "updated_at": updated_at,
+            "menu": jsonify(menu_items=menu_items, next=None).get_data(
+                as_text=True
+            ),
+        }
+
+
+def upsert_snapshots(db, snapshots):
+    """Inserts snapshots, replacing the restaurants' existing ones.
+
+    Args:
+        db: A sqlalchemy Session to write with
+        snapshots: A list of dicts of the values of MenuSnapshot's columns
+    """
+    statement = insert(MenuSnapshot)
+    statement = statement.on_conflict_do_update(
+        index_elements=[MenuSnapshot.restaurant_id],
+        set_={
+            "version": statement.excluded.version,
+            "updated_at": statement.excluded.updated_at,
+            "menu": statement.excluded.menu,
+        },
+    )
+    db.execute(statement, snapshots)
+
+
+def refresh_snapshot(db, restaurant_id):
+    """Brings a restaurant's snapshot up to date with its menu.
+
+    Must be called after the change to the menu (and to the restaurant's
+    version) and before it is committed, so both are committed together.
+    The snapshot of a deleted restaurant is deleted.
+
+    Args:
+        db: A sqlalchemy Session with the change to the menu
+        restaurant_id: An int representing the id of the restaurant
+    """
+    snapshots = list(serialize_snapshots(db, [restaurant_id]))
+    if snapshots:
+        upsert_snapshots(db, snapshots)
+    else:
+        db.execute(
+            delete(MenuSnapshot).where(
+                MenuSnapshot.restaurant_id == restaurant_id
+            )
+        )
+
+
+def rebuild_snapshots(db, batch_size=REBUILD_BATCH_SIZE):
+    """Replaces every snapshot with one serialized from the current menus.
+
+    The rebuild isn't committed, so readers keep seeing the old snapshots
+    until it is.
+
+    Args:
+        db: A sqlalchemy Session to read and write with
+        batch_size: An int representing the number of snapshots written per
+            statement
+
+    Returns:
+        count: An int representing the number of snapshots written
+    """
+    db.execute(delete(MenuSnapshot))
+
+    count = 0
+    snapshots = serialize_snapshots(db)
+    while True:
+        batch = list(islice(snapshots, batch_size))
+        if not batch:
+            return count
+        upsert_snapshots(db, batch)
+        count += len(batch)
+
+
+def check_snapshots(db):
+    """Compares every snapshot with the menu it should have been taken from.
+
+    Args:
+        db: A sqlalchemy Session to query with
+
+    Returns:
+        problems: A list of strs describing each restaurant without a
+            snapshot, snapshot of an outdated version or with a different
+            menu, and snapshot of a restaurant that doesn't exist
+    """
+    stored = {
+        snapshot.restaurant_id: snapshot
+        for snapshot in db.execute(
+            select(
+                MenuSnapshot.restaurant_id,
+                MenuSnapshot.version,
+                MenuSnapshot.updated_at,
+                MenuSnapshot.menu,
+            )
+        )
+    }
+
+    problems = []
+    for expected in serialize_snapshots(db):
+        restaurant_id = expected["restaurant_id"]
+        snapshot = stored.pop(restaurant_id, None)
+        if snapshot is None:
+            problems.append(f"Restaurant {restaurant_id} has no snapshot")
+        elif (snapshot.version, snapshot.updated_at) != (
+            expected["version"],
+            expected["updated_at"],
+        ):
+            problems.append(
+                f"Restaurant {restaurant_id}'s snapshot is of version "
+                f"{snapshot.version}, not {expected['version']}"
+            )
+        elif json.loads(snapshot.menu) != json.loads(expected["menu"]):
+            problems.append(
+                f"Restaurant {restaurant_id}'s snapshot differs from its menu"
+            )
+
+    for restaurant_id in stored:
+        problems.append(
+            f"Snapshot of restaurant {restaurant_id}, which doesn't exist"
+        )
+
+    return problems
+
+
+@click.command("rebuild-snapshots")
+def rebuild_snapshots_command():
+    """Rebuilds the menu snapshot of every restaurant in one transaction."""
+    start = time.perf_counter()
+    count = rebuild_snapshots(session)
+    session.commit()
+    elapsed = time.perf_counter() - start
+    click.echo(f"Rebuilt {count} snapshots in {elapsed:.2f}s")
+
+
+@click.command("check-snapshots")
+def check_snapshots_command():
+    """Checks every menu snapshot matches its restaurant's menu."""
+    problems = check_snapshots(session)
+    for problem in problems:
+        click.echo(problem)
+
+    if problems:
+        raise click.ClickException(
+            f"{len(problems)} snapshots are inconsistent, "
+            "run flask rebuild-snapshots"
+        )
+    click.echo("All snapshots are consistent")